@@ -0,0 +1,121 @@
+"""
+Two-level cache of /ask answers.
+
+  exact    - same normalized query text
+  semantic - a cached query whose embedding has cosine similarity >= threshold
+             and that names the same identifiers (see rare_tokens)
+
+Entries are scoped by (scope, vectorstore generation), where the scope is
+multimode plus any source filters. Any upload, delete or clear bumps the
+generation, so answers computed against the old contents are never served
+again and get dropped on the next lookup.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+_TOKEN = re.compile(r"[\w.\-]+")
+_BARE_HEX = re.compile(r"[0-9a-f]{8,}")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the question."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+def rare_tokens(query: str) -> frozenset:
+    """
+    Identifiers in a query: anything with a digit (KB5034441, 0x80070005,
+    build 22631.3007, port 5986) and bare hex codes. Embeddings barely move
+    when one of these changes, yet the answer does.
+    """
+    tokens = (t.strip(".-") for t in _TOKEN.findall(normalize_query(query)))
+    return frozenset(t for t in tokens if any(c.isdigit() for c in t) or _BARE_HEX.fullmatch(t))
+
+
+class AnswerCache:
+    """
+    In-memory LRU of {"answer", "sources"} results with a TTL.
+
+    Semantic lookups compare the query embedding against the cached entries
+    of the same scope only, so the scan is bounded by max_entries.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # (scope, generation, normalized) -> (result, unit vector, expires_at, rare tokens)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, generation: int) -> None:
+        now = time.time()
+        stale = [k for k, (_, _, expires, _) in self._entries.items() if k[1] != generation or expires <= now]
+        for k in stale:
+            del self._entries[k]
+
+    def get_exact(self, query: str, scope, generation: int):
+        key = (scope, generation, normalize_query(query))
+        with self._lock:
+            self._prune(generation)
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            self._entries.move_to_end(key)
+            return hit[0]
+
+    def get_similar(self, query: str, vector, scope, generation: int):
+        """
+        Best cached result within the similarity threshold, or None. Only
+        entries whose query has exactly the same rare tokens are candidates,
+        so "KB5034441 failed" never answers "KB5034440 failed".
+        """
+        rare = rare_tokens(query)
+        unit = _unit(vector)
+        with self._lock:
+            self._prune(generation)
+            keys = [
+                k for k, (_, vec, _, tokens) in self._entries.items()
+                if k[0] == scope and vec is not None and tokens == rare
+            ]
+            if not keys:
+                return None
+            scores = np.stack([self._entries[k][1] for k in keys]) @ unit
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]][0]
+
+    def put(self, query: str, scope, generation: int, result: dict, vector=None) -> None:
+        key = (scope, generation, normalize_query(query))
+        unit = _unit(vector) if vector is not None else None
+        with self._lock:
+            self._entries[key] = (result, unit, time.time() + self.ttl, rare_tokens(query))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _unit(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
@@ -1,21 +1,19 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain, RetrievalQA
-from langchain.chat_models import ChatOpenAI
-
-script_dir = os.path.dirname(os.path.abspath(__file__))               
-chroma_db_path = os.path.join(script_dir, "..", "chroma_db", "database")  
-
-embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-
-vectorstore = Chroma(
-    persist_directory=chroma_db_path,
-    embedding_function=embedding,
-)
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+from langchain_core.prompts import PromptTemplate
+from agent.answer_cache import AnswerCache
+from agent.llm_client import get_llm_client
+from model_registry import get_embedding
+from vectorstore import get_vectorstore
+
+RETRIEVAL_K = 3
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE", "1") != "0"
+ASK_BATCH_CONCURRENCY = int(os.environ.get("ASK_BATCH_CONCURRENCY", "8"))
+
+# Shared handle: sees documents added by /upload and resets done by /clear
+vectorstore = get_vectorstore()
+answer_cache = AnswerCache()
 chatbot_prompt = PromptTemplate.from_template(
     """
 You are a helpful assistant. Answer the following question as accurately as possible.
@@ -41,62 +39,184 @@ Base your response on the provided context and supplement with your own knowledg
 """
 )
 
-llm = ChatOpenAI(
-    model_name="gpt-3.5-turbo",
-    temperature=0.4,
-    # openai_api_key="your-api-key-here",
-)
-#Chat-Mode
-chatbot_chain = LLMChain(
-    llm=llm,
-    prompt=chatbot_prompt
-)
-#MultiMedia-Mode
-retrieval_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",                 
-    retriever=retriever,
-    return_source_documents=True,
-    chain_type_kwargs={"prompt": context_prompt}
-)
 #optional source location formatter
 def format_time(seconds: float) -> str:
     minutes = int(seconds) // 60
     secs = int(seconds) % 60
     return f"{minutes:02}:{secs:02}"
 
-def generate_response(query: str, multimode: bool = True) -> dict:
+def _format_sources(docs) -> list:
+    sources = []
+    for doc in docs:
+        meta = doc.metadata or {}
+        start = meta.get("start", 0)
+        sources.append({
+            "text": doc.page_content.strip(),
+            "time": format_time(start) if start else "",
+            "metadata": meta
+        })
+    return sources
+
+
+def _scope(multimode: bool, filters: dict = None) -> tuple:
+    """Answer-cache scope: answers differ by mode and by which sources were searched."""
+    if not multimode:
+        return (False,)
+    return (True, tuple(sorted((field, tuple(sorted(values))) for field, values in (filters or {}).items() if values)))
+
+
+def _lookup_cache(query: str, scope: tuple):
+    """
+    Returns (cached result or None, generation, query embedding). The embedding
+    is computed once here and reused for retrieval on a miss.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None, None
+    generation = vectorstore.generation()
+    hit = answer_cache.get_exact(query, scope, generation)
+    if hit is not None:
+        print("Checkpoint: Answer cache hit (exact)")
+        return hit, generation, None
+    vector = get_embedding().embed_query(query)
+    hit = answer_cache.get_similar(query, vector, scope, generation)
+    if hit is not None:
+        print("Checkpoint: Answer cache hit (semantic)")
+    return hit, generation, vector
+
+
+def _store_cache(query: str, scope: tuple, generation, vector, result: dict) -> None:
+    if generation is not None:
+        answer_cache.put(query, scope, generation, result, vector)
+
+
+def _build_prompt(query: str, multimode: bool, vector=None, filters: dict = None):
+    """Prompt for the LLM plus the retrieved documents it was built from."""
+    if not multimode:
+        return chatbot_prompt.format(question=query), []
+    if vector is None:
+        vector = get_embedding().embed_query(query)
+    # Dense + BM25 so exact tokens (KB numbers, error codes) are found too
+    docs = vectorstore.hybrid_search([query], [vector], k=RETRIEVAL_K, filters=filters)[0]
+    return _context_prompt(query, docs), docs
+
+
+def _context_prompt(query: str, docs) -> str:
+    # Same "stuff" layout RetrievalQA used: snippets separated by blank lines
+    context = "\n\n".join(doc.page_content for doc in docs)
+    return context_prompt.format(context=context, question=query)
+
+
+def generate_response(query: str, multimode: bool = True, filters: dict = None) -> dict:
     """
     If multimode=True: run RAG (retrieve + answer with context)
     Else: run a plain chat LLM chain.
+    `filters` ({"source_id": [...], "media_type": [...]}) limits retrieval to those sources.
     Returns a dict with 'answer' and 'sources'.
     """
     
     # Log checkpoint for multimode status
     print(f"Checkpoint: multimode = {multimode}")
     
+    scope = _scope(multimode, filters)
+    cached, generation, vector = _lookup_cache(query, scope)
+    if cached is not None:
+        return cached
+
     if multimode:
         print("Checkpoint: Reading from database...")
+    else:
+        print("Checkpoint: Using plain chat model...")
 
-        result = retrieval_chain({"query": query})
-        answer = result.get("result") or result.get("answer")
-        docs = result.get("source_documents", [])
-
+    prompt, docs = _build_prompt(query, multimode, vector, filters)
+    if multimode:
         print(f"Checkpoint: Source documents: {len(docs)}") #optional
 
-        sources = []
-        for doc in docs:
-            meta = doc.metadata or {}
-            start = meta.get("start", 0)
-            sources.append({
-                "text": doc.page_content.strip(),
-                "time": format_time(start) if start else "",
-                "metadata": meta
-            })
+    answer = get_llm_client().complete(prompt)
+    result = {"answer": answer, "sources": _format_sources(docs)}
+    _store_cache(query, scope, generation, vector, result)
+    return result
 
-        return {"answer": answer, "sources": sources}
 
-    else:
-        print("Checkpoint: Using plain chat model...")
-        response = chatbot_chain.run({"question": query})
-        return {"answer": response, "sources": []}
+def stream_response(query: str, multimode: bool = True, filters: dict = None):
+    """
+    Streaming generate_response: yields ("sources", [...]) as soon as retrieval
+    is done, then ("token", text) per LLM chunk, then ("done", {"answer": ...}).
+    """
+    print(f"Checkpoint: multimode = {multimode} (streaming)")
+    scope = _scope(multimode, filters)
+    cached, generation, vector = _lookup_cache(query, scope)
+    if cached is not None:
+        yield "sources", cached["sources"]
+        yield "token", cached["answer"]
+        yield "done", {"answer": cached["answer"]}
+        return
+
+    prompt, docs = _build_prompt(query, multimode, vector, filters)
+    sources = _format_sources(docs)
+    yield "sources", sources
+
+    parts = []
+    for token in get_llm_client().stream(prompt):
+        parts.append(token)
+        yield "token", token
+    answer = "".join(parts)
+    # Only complete answers are cached; a client that disconnects mid-stream stores nothing
+    _store_cache(query, scope, generation, vector, {"answer": answer, "sources": sources})
+    yield "done", {"answer": answer}
+
+
+def _embed_queries(queries: list) -> list:
+    embedding = get_embedding()
+    if hasattr(embedding, "embed_queries"):
+        return embedding.embed_queries(queries)
+    return embedding.embed_documents(queries)
+
+
+def generate_responses(
+    queries: list, multimode: bool = True, max_concurrency: int = ASK_BATCH_CONCURRENCY, filters: dict = None
+) -> list:
+    """
+    Batch generate_response: one embedding pass for all queries, one
+    multi-query Chroma search, then the LLM calls on a bounded thread pool.
+    Returns one {"answer", "sources"} (or {"error"}) per query, in input order.
+    """
+    print(f"Checkpoint: multimode = {multimode} (batch of {len(queries)})")
+    results = [None] * len(queries)
+    scope = _scope(multimode, filters)
+    generation = vectorstore.generation() if ANSWER_CACHE_ENABLED else None
+
+    if generation is not None:
+        for i, query in enumerate(queries):
+            results[i] = answer_cache.get_exact(query, scope, generation)
+
+    # Embed every distinct remaining query once
+    pending = [i for i, r in enumerate(results) if r is None]
+    distinct = list(dict.fromkeys(queries[i] for i in pending))
+    vectors = dict(zip(distinct, _embed_queries(distinct))) if distinct and (multimode or generation is not None) else {}
+
+    if generation is not None:
+        for i in pending:
+            results[i] = answer_cache.get_similar(queries[i], vectors[queries[i]], scope, generation)
+        distinct = list(dict.fromkeys(queries[i] for i in pending if results[i] is None))
+    print(f"Checkpoint: {len(queries) - len(distinct)} cached / duplicate, {len(distinct)} to answer")
+
+    docs_by_query = {}
+    if multimode and distinct:
+        print("Checkpoint: Reading from database...")
+        hits = vectorstore.hybrid_search(distinct, [vectors[q] for q in distinct], k=RETRIEVAL_K, filters=filters)
+        docs_by_query = dict(zip(distinct, hits))
+
+    def answer(query):
+        docs = docs_by_query.get(query, [])
+        prompt = _context_prompt(query, docs) if multimode else chatbot_prompt.format(question=query)
+        try:
+            result = {"answer": get_llm_client().complete(prompt), "sources": _format_sources(docs)}
+        except Exception as e:
+            return {"error": str(e)}
+        _store_cache(query, scope, generation, vectors.get(query), result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="ask-batch") as pool:
+        answered = dict(zip(distinct, pool.map(answer, distinct)))
+
+    return [r if r is not None else answered[q] for q, r in zip(queries, results)]
@@ -0,0 +1,94 @@
+"""
+Pluggable LLM clients for /ask.
+
+Every client exposes complete(prompt) -> str and stream(prompt) -> iterator of
+text chunks. get_llm_client() returns the one named by LLM_BACKEND:
+
+  openai - ChatOpenAI (default)
+  fake   - local deterministic model that streams word by word, no API key needed
+
+Other backends can be added with register_llm_client(name, factory).
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "gpt-3.5-turbo")
+LLM_TEMPERATURE = float(os.environ.get("LLM_TEMPERATURE", "0.4"))
+FAKE_LLM_TOKEN_DELAY = float(os.environ.get("FAKE_LLM_TOKEN_DELAY", "0.02"))
+
+
+class OpenAIChatClient:
+    def __init__(self, model_name: str = LLM_MODEL_NAME, temperature: float = LLM_TEMPERATURE):
+        from langchain_openai import ChatOpenAI
+        self.llm = ChatOpenAI(
+            model_name=model_name,
+            temperature=temperature,
+            # openai_api_key="your-api-key-here",
+        )
+
+    def complete(self, prompt: str) -> str:
+        return self.llm.invoke(prompt).content
+
+    def stream(self, prompt: str):
+        for chunk in self.llm.stream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+
+class FakeStreamingClient:
+    """
+    Stand-in model for tests and local runs. The reply is derived from the
+    prompt, so the same question always gets the same answer.
+    """
+
+    def __init__(self, token_delay: float = FAKE_LLM_TOKEN_DELAY, reply: str = None):
+        self.token_delay = token_delay
+        self.reply = reply
+
+    def _reply(self, prompt: str) -> str:
+        if self.reply is not None:
+            return self.reply
+        question = prompt.rsplit("Question:", 1)[-1].strip().splitlines()[0] if "Question:" in prompt else prompt.strip()
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"(fake answer {digest}) You asked: {question}"
+
+    def complete(self, prompt: str) -> str:
+        return self._reply(prompt)
+
+    def stream(self, prompt: str):
+        # Word tokens keep their trailing whitespace, so "".join(stream) == complete()
+        for token in re.findall(r"\S+\s*", self._reply(prompt)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
+
+_factories = {
+    "openai": OpenAIChatClient,
+    "fake": FakeStreamingClient,
+}
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def register_llm_client(name: str, factory) -> None:
+    """Make another backend selectable through LLM_BACKEND / get_llm_client(name)."""
+    with _clients_lock:
+        _factories[name] = factory
+        _clients.pop(name, None)
+
+
+def get_llm_client(name: str = None):
+    """Shared client for the backend, created on first use."""
+    name = name or LLM_BACKEND
+    with _clients_lock:
+        if name not in _clients:
+            if name not in _factories:
+                raise ValueError(f"Unknown LLM backend: {name}")
+            print(f"Checkpoint: Loading LLM backend '{name}'...")
+            _clients[name] = _factories[name]()
+        return _clients[name]
@@ -0,0 +1,218 @@
+"""
+Request parsing and patch-run setup shared by the Flask app (app.py) and
+the ASGI serving mode (asgi.py), so both servers accept the same bodies
+and answer with the same errors.
+"""
+import json
+import os
+import tempfile
+import uuid
+from agent.ask_question import ASK_BATCH_CONCURRENCY
+from patch_mag.workflows.fleet import FLEET_MAX_CONCURRENCY, FLEET_MAX_REBOOTING, FLEET_WAVE_SIZE
+from patch_mag.workflows.patch_flow import build_patch_graph, get_checkpointer, run_config
+
+ASK_BATCH_MAX_QUERIES = int(os.environ.get("ASK_BATCH_MAX_QUERIES", "500"))
+UPLOAD_FOLDER = 'uploads'
+
+# Request keys accepted by the /ask routes -> chunk metadata field they filter on
+ASK_FILTER_KEYS = {'source_ids': 'source_id', 'media_types': 'media_type', 'filenames': 'filename'}
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+def upload_path(filename):
+    """
+    Where to save an upload: a job-unique name in UPLOAD_FOLDER, so two
+    uploads with the same name never overwrite each other's file while queued.
+    `filename` should already be secure_filename()'d.
+    """
+    return os.path.abspath(os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{filename}"))
+
+
+def voice_clip_path(filename):
+    """
+    A fresh temp file for a voice-command recording. The clip is only needed
+    until it is transcribed, so callers remove it with discard() afterwards.
+    """
+    fd, path = tempfile.mkstemp(prefix='voice_', suffix=os.path.splitext(filename)[1] or '.wav')
+    os.close(fd)
+    return path
+
+
+def discard(path):
+    """Remove a temp file if it is (still) there."""
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def ask_filters(data):
+    """Source filters from an /ask body, e.g. {"source_ids": [...], "media_types": ["pdf"]}."""
+    filters = {}
+    for key, field in ASK_FILTER_KEYS.items():
+        values = data.get(key)
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f'{key} must be a list of strings')
+        if values:
+            filters[field] = values
+    return filters or None
+
+
+def parse_ask(data):
+    """(query, multimode, filters) from an /ask or /ask/stream body; ValueError if invalid."""
+    query = data.get('query', '').strip()
+    multimode = bool(data.get('multimode', True))
+    if not query:
+        raise ValueError('No query provided')
+    return query, multimode, ask_filters(data)
+
+
+def _int_field(data, key, default, minimum):
+    """data[key] (or default) as an int >= minimum; ValueError naming the key otherwise."""
+    value = data.get(key, default)
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{key} must be an integer')
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be an integer') from None
+    if value < minimum:
+        raise ValueError(f'{key} must be at least {minimum}')
+    return value
+
+
+def parse_ask_batch(data):
+    """(queries, multimode, filters, max_concurrency) from an /ask/batch body; ValueError if invalid."""
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries:
+        raise ValueError('No queries provided')
+    if len(queries) > ASK_BATCH_MAX_QUERIES:
+        raise ValueError(f'At most {ASK_BATCH_MAX_QUERIES} queries per batch')
+    if not all(isinstance(q, str) for q in queries):
+        raise ValueError('queries must be a list of strings')
+    queries = [q.strip() for q in queries]
+    if not all(queries):
+        raise ValueError('Empty query in batch')
+
+    multimode = bool(data.get('multimode', True))
+    filters = ask_filters(data)
+    # Callers may lower the LLM concurrency, not raise it past the server's limit
+    max_concurrency = min(_int_field(data, 'max_concurrency', ASK_BATCH_CONCURRENCY, 1), ASK_BATCH_CONCURRENCY)
+    return queries, multimode, filters, max_concurrency
+
+
+def fleet_inventory(data):
+    """Per-host VM dicts from a /patch/fleet body, with the shared defaults applied; ValueError if invalid."""
+    hosts = data.get('hosts') or []
+    if not hosts:
+        raise ValueError('No hosts provided')
+
+    inventory = []
+    for entry in hosts:
+        vm = {
+            'host': entry.get('host'),
+            'username': entry.get('username', data.get('username')),
+            'password': entry.get('password', data.get('password')),
+            'os': (entry.get('os') or data.get('os') or 'windows').lower(),
+        }
+        if 'transport' in entry:
+            vm['transport'] = entry['transport']
+        if not (vm['host'] and vm['username'] and vm['password']):
+            raise ValueError(f"Missing host, username, or password for {entry.get('host')}")
+        inventory.append(vm)
+    return inventory
+
+
+def parse_fleet(data):
+    """(inventory, max_concurrency, max_rebooting, wave_size) from a /patch/fleet body; ValueError if invalid."""
+    inventory = fleet_inventory(data)
+    max_concurrency = _int_field(data, 'max_concurrency', FLEET_MAX_CONCURRENCY, 1)
+    max_rebooting = _int_field(data, 'max_rebooting', FLEET_MAX_REBOOTING, 1)
+    wave_size = _int_field(data, 'wave_size', FLEET_WAVE_SIZE, 0)  # 0 = one rolling wave
+    return inventory, max_concurrency, max_rebooting, wave_size
+
+
+class PatchRequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def prepare_patch_run(data, emit=None):
+    """
+    Validate a /patch body (new run, or {run_id, password} to resume) and
+    return (run_id, vm, run) where run() executes the checkpointed flow and
+    returns its final state.
+    """
+    run_id = data.get('run_id')
+    if run_id:
+        if not data.get('password'):
+            raise PatchRequestError('Missing password to resume run')
+    else:
+        required_keys = {'host', 'username', 'password', 'os'}
+        if not required_keys.issubset(data.keys()):
+            raise PatchRequestError('Missing required VM fields')
+
+    # Checkpointed flow: each finished node is saved, so a crash resumes where it stopped
+    flow = build_patch_graph(checkpointer=get_checkpointer())
+
+    if run_id:
+        config = run_config(run_id, data['password'], emit)
+        snapshot = flow.get_state(config)
+        if not snapshot.values:
+            raise PatchRequestError(f'Unknown run_id: {run_id}', 404)
+        vm = snapshot.values["vm_info"]
+        if not snapshot.next:
+            return run_id, vm, lambda: snapshot.values
+
+        def run():
+            print(f"♻️ Resuming patch run {run_id} for {vm['host']} at {snapshot.next[0]}")
+            return flow.invoke(None, config)
+        return run_id, vm, run
+
+    run_id = uuid.uuid4().hex
+    # Password goes in the run config only, never into the checkpointed state
+    vm = {
+        "host": data['host'],
+        "username": data['username'],
+        "os": data['os'].lower()
+    }
+
+    def run():
+        print("🔥 Triggering patch flow for", vm["host"])
+        return flow.invoke({
+            "vm_info": vm,
+            "update_status": "",
+            "reboot_updates": [],
+            "no_reboot_updates": [],
+            "log": ["🚀 Patch flow triggered."]
+        }, run_config(run_id, data['password'], emit))
+    return run_id, vm, run
+
+
+def patch_run_status(run_id):
+    """Saved state of a patch run as returned by GET /patch/<run_id>, or None if unknown."""
+    flow = build_patch_graph(checkpointer=get_checkpointer())
+    snapshot = flow.get_state(run_config(run_id))
+    if not snapshot.values:
+        return None
+    return {
+        'run_id': run_id,
+        'host': snapshot.values['vm_info']['host'],
+        'update_status': snapshot.values['update_status'],
+        'next': list(snapshot.next),
+        'log': snapshot.values['log']
+    }
@@ -1,33 +1,53 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import json
 import os
-import shutil
+import queue
+import threading
 import traceback
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
-from audio_processing.extract_audio import extract_audio
-from audio_processing.transcribe_whisper import transcribe_audio
-from embed_text import embed_text  # new import for text/pdf embedding
-from agent.ask_question import generate_response
+from ingest import SUPPORTED_EXTS
+from jobs import enqueue_ingest, get_job_queue, start_workers
+from agent.ask_question import generate_response, generate_responses, stream_response
+from api_helpers import (
+    SSE_HEADERS,
+    UPLOAD_FOLDER,
+    PatchRequestError,
+    discard,
+    parse_ask,
+    parse_ask_batch,
+    parse_fleet,
+    patch_run_status as get_patch_run_status,
+    prepare_patch_run,
+    sse,
+    upload_path,
+    voice_clip_path,
+)
 from winrmssh import process_audio_and_execute
-from patch_mag.workflows.patch_flow import build_patch_graph
+from patch_mag.workflows.patch_flow import get_checkpointer
+from patch_mag.workflows.fleet import run_fleet
+from patch_mag.fake_winrm import install_fake_connector
+from model_registry import warmup
+from vectorstore import get_vectorstore
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Hosts with "transport": "fake" talk to the in-process fake WinRM endpoint
+if os.environ.get('ENABLE_FAKE_WINRM', '0') == '1':
+    install_fake_connector()
+
 # Upload folder setup
-UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-CHROMA_DB_PATH = os.path.join('chroma_db', 'database')
-
-# Allowed extensions
-VIDEO_EXTS = {'.mp4', '.mkv'}
-AUDIO_EXTS = {'.mp3'}
-TEXT_EXTS = {'.txt', '.pdf'}
 
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    """
+    Saves the file and queues it for ingestion (extract / transcribe / embed).
+    Returns 202 with a job ID; poll /jobs/<id> for progress and the result.
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -36,47 +56,36 @@ def upload_file():
         return jsonify({'error': 'Empty filename'}), 400
 
     filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in SUPPORTED_EXTS:
+        return jsonify({'error': f'Unsupported file type: {ext}'}), 400
+
+    file_path = upload_path(filename)
     file.save(file_path)
 
-    ext = os.path.splitext(filename)[1].lower()
     try:
-        if ext in VIDEO_EXTS:
-            audio_path = os.path.splitext(file_path)[0] + '_audio.wav'
-            extract_audio(file_path, audio_path)
-            transcription = transcribe_audio(audio_path)
-            return jsonify({
-                'type': 'video',
-                'transcription': transcription
-            }), 200
-
-        elif ext in AUDIO_EXTS:
-            transcription = transcribe_audio(file_path)
-            return jsonify({
-                'type': 'audio',
-                'transcription': transcription
-            }), 200
-
-        elif ext in TEXT_EXTS:
-            # embed_text now returns a list of dicts
-            docs = embed_text(
-                file_path,
-                persist_directory=os.path.join('chroma_db', 'database')
-            )
-            return jsonify({
-                'type': 'text',
-                'documents': docs,
-                'count': len(docs)
-            }), 200
-
-        else:
-            return jsonify({'error': f'Unsupported file type: {ext}'}), 400
-
+        job_id = enqueue_ingest(file_path, filename)
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/jobs/{job_id}'
+        }), 202
     except Exception as e:
-        # log full traceback if needed
+        traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-        
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status, current stage, progress, per-stage timings and result/error of an ingest job."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job.pop('payload', None)
+    job.pop('worker_pid', None)
+    return jsonify(job), 200
+
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     # Audio-execution path remains unchanged
@@ -91,27 +100,70 @@ def ask_question():
         if not (host and username and password):
             return jsonify({'error': 'Missing host, username, or password'}), 400
 
-        filename   = secure_filename(audio_file.filename)
-        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        audio_file.save(audio_path)
-
-        result = process_audio_and_execute(audio_path, host, username, password)
+        audio_path = voice_clip_path(secure_filename(audio_file.filename))
+        try:
+            audio_file.save(audio_path)
+            result = process_audio_and_execute(audio_path, host, username, password)
+        finally:
+            discard(audio_path)
         return jsonify(result), 200
 
     # JSON chat path
-    data = request.get_json() or {}
-    query     = data.get('query', '').strip()
-    # pick up your boolean flag here
-    multimode = bool(data.get('multimode', True))
-
-    if not query:
-        return jsonify({'error': 'No query provided'}), 400
+    try:
+        query, multimode, filters = parse_ask(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Pass multimode into your generator
-    result = generate_response(query, multimode=multimode)
+    # Pass multimode (and any source filters) into your generator
+    result = generate_response(query, multimode=multimode, filters=filters)
     return jsonify(result), 200
 
 
+@app.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """
+    Accepts JSON: { "queries": ["...", ...], "multimode": true, "max_concurrency": 8 }
+    plus the same source filters as /ask (source_ids, media_types, filenames).
+    Returns { "results": [...] } with one /ask result (or {"error"}) per query, in order.
+    """
+    try:
+        queries, multimode, filters, max_concurrency = parse_ask_batch(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        results = generate_responses(queries, multimode=multimode, max_concurrency=max_concurrency, filters=filters)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'results': results}), 200
+
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """
+    Same JSON body as /ask; answers with Server-Sent Events:
+      sources - [{text, time, metadata}] once retrieval is done
+      token   - {text} for each chunk of the answer
+      done    - {answer} the full answer
+      error   - {error}
+    """
+    try:
+        query, multimode, filters = parse_ask(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Sources go out as soon as retrieval is done, then tokens as the LLM produces them
+    def stream():
+        try:
+            for event, payload in stream_response(query, multimode=multimode, filters=filters):
+                yield sse(event, {'text': payload} if event == 'token' else payload)
+        except Exception as e:
+            traceback.print_exc()
+            yield sse('error', {'error': str(e)})
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
 @app.route('/patch', methods=['POST'])
 def patch_machine():
     """
@@ -122,60 +174,131 @@ def patch_machine():
         "password": "pass",
         "os": "windows" | "linux" | "mac"
       }
-    Invokes the patch flow and returns the result.
+    or, to resume an interrupted run, { "run_id": "...", "password": "pass" }.
+    Invokes the patch flow and returns the result with its run_id.
     """
     data = request.get_json() or {}
-    required_keys = {'host', 'username', 'password', 'os'}
-
-    if not required_keys.issubset(data.keys()):
-        return jsonify({'error': 'Missing required VM fields'}), 400
+    run_id = data.get('run_id')
+    try:
+        run_id, vm, run = prepare_patch_run(data)
+    except PatchRequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e), 'run_id': run_id}), 500
 
     try:
-        vm = {
-            "host": data['host'],
-            "username": data['username'],
-            "password": data['password'],
-            "os": data['os'].lower()
-        }
-
-        print("🔥 Triggering patch flow for", vm["host"])
-
-        # Build and run patch flow
-        flow = build_patch_graph()
-        result = flow.invoke({
-            "vm_info": vm,
-            "update_status": "",
-            "reboot_updates": [],
-            "no_reboot_updates": [],
-            "log": ["🚀 Patch flow triggered."]
-        })
+        result = run()
 
         return jsonify({
+    "run_id": run_id,
     "log": result["log"],
     "meta": f"🔥 Triggering patch flow for {vm['host']}"
 }), 200
 
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': str(e), 'run_id': run_id}), 500
+
+
+@app.route('/patch/stream', methods=['POST'])
+def patch_machine_stream():
+    """
+    Same body as /patch, but answers with Server-Sent Events while the flow runs:
+      run    - {run_id, host} once the run starts
+      node   - {node, phase: start|end, seconds} on each node transition
+      log    - {line} for every line appended to the patch log
+      output - {node, text} remote stdout as it arrives
+      done   - {run_id, log, update_status} when the flow finishes
+      error  - {error, run_id}
+    """
+    data = request.get_json() or {}
+    events = queue.Queue()
+
+    try:
+        run_id, vm, run = prepare_patch_run(data, emit=lambda event, payload: events.put((event, payload)))
+    except PatchRequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e), 'run_id': data.get('run_id')}), 500
+
+    def worker():
+        try:
+            result = run()
+            events.put(('done', {
+                'run_id': run_id,
+                'log': result['log'],
+                'update_status': result['update_status']
+            }))
+        except Exception as e:
+            traceback.print_exc()
+            events.put(('error', {'error': str(e), 'run_id': run_id}))
+
+    # The flow keeps running (and checkpointing) even if the client disconnects
+    threading.Thread(target=worker, name=f"patch-{run_id}", daemon=True).start()
+
+    def stream():
+        yield sse('run', {'run_id': run_id, 'host': vm['host']})
+        while True:
+            try:
+                event, payload = events.get(timeout=15)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse(event, payload)
+            if event in ('done', 'error'):
+                return
+
+    return Response(stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/patch/<run_id>', methods=['GET'])
+def patch_run_status(run_id):
+    """Saved state of a patch run: log so far, status and the node it will resume at."""
+    status = get_patch_run_status(run_id)
+    if status is None:
+        return jsonify({'error': f'Unknown run_id: {run_id}'}), 404
+    return jsonify(status), 200
+
+
+@app.route('/patch/fleet', methods=['POST'])
+def patch_fleet():
+    """
+    Accepts JSON:
+      {
+        "hosts": [{"host": "...", "username": "...", "password": "...", "os": "windows"}, ...],
+        "username": "...", "password": "...",      # optional defaults for every host
+        "max_concurrency": 10, "max_rebooting": 2, "wave_size": 0
+      }
+    Streams one JSON line per host as it finishes, then a summary line.
+    """
+    data = request.get_json() or {}
+    try:
+        inventory, max_concurrency, max_rebooting, wave_size = parse_fleet(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    print(f"🔥 Triggering fleet patch for {len(inventory)} hosts")
+    records = run_fleet(
+        inventory,
+        max_concurrency=max_concurrency,
+        max_rebooting=max_rebooting,
+        wave_size=wave_size,
+        checkpointer=get_checkpointer(),
+    )
+    lines = (json.dumps(record) + '\n' for record in records)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
 
 @app.route('/process_audio', methods=['POST'])
 def process_audio_route():
     """
     Accepts multipart/form-data with:
-      - 'audio': the recorded WAV file
-      - 'text': optional user instruction
+      - 'audio': the recorded WAV file (optional when 'text' is given)
+      - 'text': optional user instruction; when present Whisper is skipped
       - 'host', 'username', 'password': machine credentials
 
     Returns JSON: { transcription, command, output }
     """
-    if 'audio' not in request.files:
-        return jsonify({'error': 'No audio file part'}), 400
-
-    audio_file = request.files['audio']
-    if audio_file.filename == '':
-        return jsonify({'error': 'Empty filename'}), 400
-
     host = request.form.get('host', '').strip()
     username = request.form.get('username', '').strip()
     password = request.form.get('password', '').strip()
@@ -184,29 +307,63 @@ def process_audio_route():
     if not (host and username and password):
         return jsonify({'error': 'Missing host, username, or password'}), 400
 
-    filename = secure_filename(audio_file.filename)
-    audio_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    audio_file.save(audio_path)
+    audio_path = None
+    audio_file = request.files.get('audio')
+    if audio_file is not None and audio_file.filename != '':
+        audio_path = voice_clip_path(secure_filename(audio_file.filename))
+    elif not user_text:
+        return jsonify({'error': 'No audio file or text provided'}), 400
 
-    result = process_audio_and_execute(audio_path, host, username, password, user_text)
+    try:
+        if audio_path:
+            audio_file.save(audio_path)
+        result = process_audio_and_execute(audio_path, host, username, password, user_text)
+    finally:
+        discard(audio_path)
     return jsonify(result), 200
 
 
+@app.route('/sources', methods=['GET'])
+def list_sources():
+    """Ingested files: source_id, filename, media_type, content_hash, chunks, added_at."""
+    return jsonify({'sources': get_vectorstore().list_sources()}), 200
+
+
+@app.route('/sources/<source_id>', methods=['DELETE'])
+def delete_source(source_id):
+    """Remove one ingested file's chunks without clearing the rest of the store."""
+    vectorstore = get_vectorstore()
+    if vectorstore.get_source(source_id) is None:
+        return jsonify({'error': 'Source not found'}), 404
+    try:
+        removed = vectorstore.delete_source(source_id)
+        print(f"🗑️ Deleted source {source_id} ({removed} chunks)")
+        return jsonify({'source_id': source_id, 'deleted_chunks': removed}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/clear', methods=['POST'])
 def clear_chroma_db():
     try:
-        if os.path.exists(CHROMA_DB_PATH):
-            shutil.rmtree(CHROMA_DB_PATH)
-            print(f"✅ Deleted Chroma DB at: {CHROMA_DB_PATH}")
-            return jsonify({"message": "Chroma DB cleared"}), 200
-        else:
-            print(f"⚠️ Chroma DB not found at: {CHROMA_DB_PATH}")
-            return jsonify({"message": "No Chroma DB found"}), 404
+        # Reset the collection in place so live retrievers stay valid
+        vectorstore = get_vectorstore()
+        vectorstore.reset()
+        print(f"✅ Cleared Chroma collection at: {vectorstore.persist_directory}")
+        return jsonify({"message": "Chroma DB cleared"}), 200
     except Exception as e:
         traceback.print_exc()  # Log full traceback in console
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # With debug=True only the reloader child serves requests, so set up there.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Load MiniLM once before serving so the first request isn't slow; ingest
+        # Whisper lives in the worker processes and voice commands use their own model
+        if os.environ.get('WARMUP_MODELS', '1') == '1':
+            warmup(whisper=False)
+        start_workers()
     app.run(host='0.0.0.0', port=5000, debug=True)
 
 
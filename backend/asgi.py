@@ -0,0 +1,439 @@
+"""
+ASGI serving mode: the API of app.py on Starlette, run by serve.py under
+uvicorn with several worker processes. app.py stays the development server.
+
+Routes are async and only parse requests and write responses. Blocking
+work runs in bounded pools owned by each worker process:
+
+  SERVE_THREADS         retrieval, LLM calls, vectorstore and job queue
+  SERVE_REMOTE_THREADS  patch flows, fleet runs and remote commands
+  SERVE_PROCESSES       Whisper for voice commands (0 = use SERVE_THREADS)
+
+Requests beyond a pool's size wait for a free slot instead of adding
+threads. Each worker loads the embedding model, vectorstore and LLM client
+and runs one retrieval at startup. On shutdown the pools finish the work
+they have started.
+"""
+import asyncio
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import shutil
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from werkzeug.utils import secure_filename
+from agent.ask_question import generate_response, generate_responses, stream_response
+from agent.llm_client import get_llm_client
+from api_helpers import (
+    SSE_HEADERS,
+    UPLOAD_FOLDER,
+    PatchRequestError,
+    discard,
+    parse_ask,
+    parse_ask_batch,
+    parse_fleet,
+    patch_run_status,
+    prepare_patch_run,
+    sse,
+    upload_path,
+    voice_clip_path,
+)
+from ingest import SUPPORTED_EXTS
+from jobs import get_job_queue, start_workers
+from model_registry import get_embedding, get_transcription_engine, warmup
+from patch_mag.fake_winrm import install_fake_connector
+from patch_mag.workflows.fleet import run_fleet
+from patch_mag.workflows.patch_flow import get_checkpointer
+from vectorstore import get_vectorstore
+from winrmssh import (
+    NO_SPEECH_OUTPUT,
+    VOICE_TRANSCRIBE_ENGINE,
+    VOICE_WHISPER_MODEL,
+    process_audio_and_execute,
+    transcribe_command,
+)
+
+SERVE_THREADS = int(os.environ.get("SERVE_THREADS", "32"))
+SERVE_REMOTE_THREADS = int(os.environ.get("SERVE_REMOTE_THREADS", "16"))
+SERVE_PROCESSES = int(os.environ.get("SERVE_PROCESSES", "1"))
+SERVE_PRELOAD = os.environ.get("SERVE_PRELOAD", "1") == "1"
+# Set by serve.py, which runs the ingest workers once for all web workers
+INGEST_IN_SUPERVISOR = os.environ.get("INGEST_IN_SUPERVISOR", "0") == "1"
+
+if os.environ.get('ENABLE_FAKE_WINRM', '0') == '1':
+    install_fake_connector()
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+_threads = None
+_remote = None
+_processes = None
+
+
+async def _run(pool, fn, *args, **kwargs):
+    """Run a blocking call in `pool` without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+
+async def _iterate(pool, iterator):
+    """Async view of a blocking iterator; each next() runs in `pool`."""
+    done = object()
+    while True:
+        item = await _run(pool, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+async def _json_body(request) -> dict:
+    """The JSON body, or {} if it is missing or not an object."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _error(message, status=400, **extra):
+    return JSONResponse({'error': message, **extra}, status_code=status)
+
+
+def _save_upload(upload: UploadFile, path: str) -> str:
+    with open(path, 'wb') as out:
+        shutil.copyfileobj(upload.file, out, 1 << 20)
+    return path
+
+
+def _init_transcriber() -> None:
+    """Process pool initializer: load the voice-command Whisper model once."""
+    get_transcription_engine(VOICE_TRANSCRIBE_ENGINE, VOICE_WHISPER_MODEL)
+
+
+def _preload() -> None:
+    # Web workers answer questions; ingest Whisper lives in the ingest workers
+    warmup(whisper=False)
+    get_llm_client()
+    # One retrieval opens the Chroma and lexical indexes before traffic arrives; the
+    # handle reopens by itself once ingest workers or other web workers change the store
+    get_vectorstore().hybrid_search(["warmup"], [get_embedding().embed_query("warmup")], k=1)
+
+
+async def _run_voice_command(audio_path, host, username, password, user_text=None) -> dict:
+    """process_audio_and_execute with the transcription moved to the process pool."""
+    if user_text or not audio_path:
+        return await _run(_remote, process_audio_and_execute, audio_path, host, username, password, user_text)
+
+    text = await _run(_processes or _threads, transcribe_command, audio_path)
+    if not text:
+        return {"transcription": "", "command": "", "output": NO_SPEECH_OUTPUT}
+    result = await _run(_remote, process_audio_and_execute, None, host, username, password, text)
+    result["transcription"] = text
+    return result
+
+
+async def upload_file(request):
+    """Same as app.py /upload: save the file, queue ingestion, 202 with the job ID."""
+    form = await request.form()
+    upload = form.get('file')
+    if not isinstance(upload, UploadFile):
+        return _error('No file provided')
+    if upload.filename == '':
+        return _error('Empty filename')
+    filename = secure_filename(upload.filename)
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in SUPPORTED_EXTS:
+        return _error(f'Unsupported file type: {ext}')
+
+    try:
+        file_path = await _run(_threads, _save_upload, upload, upload_path(filename))
+        job_id = await _run(_threads, get_job_queue().enqueue, "ingest", {"file_path": file_path, "filename": filename})
+    except Exception as e:
+        traceback.print_exc()
+        return _error(str(e), 500)
+    return JSONResponse({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}, status_code=202)
+
+
+async def job_status(request):
+    job = await _run(_threads, get_job_queue().get, request.path_params['job_id'])
+    if job is None:
+        return _error('Job not found', 404)
+    job.pop('payload', None)
+    job.pop('worker_pid', None)
+    return JSONResponse(job)
+
+
+async def ask_question(request):
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        audio = form.get('audio')
+        if isinstance(audio, UploadFile):
+            if audio.filename == '':
+                return _error('Empty audio filename')
+            host = str(form.get('host', '')).strip()
+            username = str(form.get('username', '')).strip()
+            password = str(form.get('password', '')).strip()
+            if not (host and username and password):
+                return _error('Missing host, username, or password')
+            audio_path = voice_clip_path(secure_filename(audio.filename))
+            try:
+                await _run(_threads, _save_upload, audio, audio_path)
+                return JSONResponse(await _run_voice_command(audio_path, host, username, password))
+            finally:
+                discard(audio_path)
+
+    try:
+        query, multimode, filters = parse_ask(await _json_body(request))
+    except ValueError as e:
+        return _error(str(e))
+    result = await _run(_threads, generate_response, query, multimode=multimode, filters=filters)
+    return JSONResponse(result)
+
+
+async def ask_batch(request):
+    try:
+        queries, multimode, filters, max_concurrency = parse_ask_batch(await _json_body(request))
+    except ValueError as e:
+        return _error(str(e))
+    try:
+        # generate_responses fans out on its own pool, bounded by max_concurrency
+        results = await _run(
+            _threads, generate_responses, queries, multimode=multimode, max_concurrency=max_concurrency, filters=filters
+        )
+    except Exception as e:
+        traceback.print_exc()
+        return _error(str(e), 500)
+    return JSONResponse({'results': results})
+
+
+async def ask_question_stream(request):
+    try:
+        query, multimode, filters = parse_ask(await _json_body(request))
+    except ValueError as e:
+        return _error(str(e))
+
+    async def stream():
+        try:
+            events = stream_response(query, multimode=multimode, filters=filters)
+            async for event, payload in _iterate(_threads, events):
+                yield sse(event, {'text': payload} if event == 'token' else payload)
+        except Exception as e:
+            traceback.print_exc()
+            yield sse('error', {'error': str(e)})
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def patch_machine(request):
+    data = await _json_body(request)
+    run_id = data.get('run_id')
+    try:
+        run_id, vm, run = await _run(_threads, prepare_patch_run, data)
+    except PatchRequestError as e:
+        return _error(str(e), e.status)
+    except Exception as e:
+        return _error(str(e), 500, run_id=run_id)
+
+    try:
+        result = await _run(_remote, run)
+    except Exception as e:
+        return _error(str(e), 500, run_id=run_id)
+    return JSONResponse({
+        "run_id": run_id,
+        "log": result["log"],
+        "meta": f"🔥 Triggering patch flow for {vm['host']}"
+    })
+
+
+async def patch_machine_stream(request):
+    data = await _json_body(request)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, payload):
+        try:
+            loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+        except RuntimeError:
+            pass  # loop closed during shutdown; the run is still checkpointed
+
+    try:
+        run_id, vm, run = await _run(_threads, prepare_patch_run, data, emit)
+    except PatchRequestError as e:
+        return _error(str(e), e.status)
+    except Exception as e:
+        return _error(str(e), 500, run_id=data.get('run_id'))
+
+    def worker():
+        try:
+            result = run()
+            emit('done', {
+                'run_id': run_id,
+                'log': result['log'],
+                'update_status': result['update_status']
+            })
+        except Exception as e:
+            traceback.print_exc()
+            emit('error', {'error': str(e), 'run_id': run_id})
+
+    # The flow keeps running (and checkpointing) even if the client disconnects
+    _remote.submit(worker)
+
+    async def stream():
+        yield sse('run', {'run_id': run_id, 'host': vm['host']})
+        while True:
+            try:
+                event, payload = await asyncio.wait_for(events.get(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse(event, payload)
+            if event in ('done', 'error'):
+                return
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def get_patch_run(request):
+    run_id = request.path_params['run_id']
+    status = await _run(_threads, patch_run_status, run_id)
+    if status is None:
+        return _error(f'Unknown run_id: {run_id}', 404)
+    return JSONResponse(status)
+
+
+async def patch_fleet(request):
+    data = await _json_body(request)
+    try:
+        inventory, max_concurrency, max_rebooting, wave_size = parse_fleet(data)
+    except ValueError as e:
+        return _error(str(e))
+
+    print(f"🔥 Triggering fleet patch for {len(inventory)} hosts")
+    records = await _run(
+        _remote,
+        run_fleet,
+        inventory,
+        max_concurrency=max_concurrency,
+        max_rebooting=max_rebooting,
+        wave_size=wave_size,
+        checkpointer=get_checkpointer(),
+    )
+
+    async def lines():
+        async for record in _iterate(_remote, records):
+            yield json.dumps(record) + '\n'
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+async def process_audio_route(request):
+    form = await request.form()
+    host = str(form.get('host', '')).strip()
+    username = str(form.get('username', '')).strip()
+    password = str(form.get('password', '')).strip()
+    user_text = str(form.get('text', '')).strip() or None
+    if not (host and username and password):
+        return _error('Missing host, username, or password')
+
+    audio_path = None
+    audio = form.get('audio')
+    if isinstance(audio, UploadFile) and audio.filename != '':
+        audio_path = voice_clip_path(secure_filename(audio.filename))
+    elif not user_text:
+        return _error('No audio file or text provided')
+
+    try:
+        if audio_path:
+            await _run(_threads, _save_upload, audio, audio_path)
+        return JSONResponse(await _run_voice_command(audio_path, host, username, password, user_text))
+    finally:
+        discard(audio_path)
+
+
+async def list_sources(request):
+    sources = await _run(_threads, get_vectorstore().list_sources)
+    return JSONResponse({'sources': sources})
+
+
+async def delete_source(request):
+    source_id = request.path_params['source_id']
+    vectorstore = get_vectorstore()
+    if await _run(_threads, vectorstore.get_source, source_id) is None:
+        return _error('Source not found', 404)
+    try:
+        removed = await _run(_threads, vectorstore.delete_source, source_id)
+    except Exception as e:
+        traceback.print_exc()
+        return _error(str(e), 500)
+    print(f"🗑️ Deleted source {source_id} ({removed} chunks)")
+    return JSONResponse({'source_id': source_id, 'deleted_chunks': removed})
+
+
+async def clear_chroma_db(request):
+    vectorstore = get_vectorstore()
+    try:
+        await _run(_threads, vectorstore.reset)
+    except Exception as e:
+        traceback.print_exc()
+        return _error(str(e), 500)
+    print(f"✅ Cleared Chroma collection at: {vectorstore.persist_directory}")
+    return JSONResponse({"message": "Chroma DB cleared"})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _threads, _remote, _processes
+    _threads = ThreadPoolExecutor(SERVE_THREADS, thread_name_prefix="serve")
+    _remote = ThreadPoolExecutor(SERVE_REMOTE_THREADS, thread_name_prefix="remote")
+    if SERVE_PROCESSES > 0:
+        _processes = ProcessPoolExecutor(
+            max_workers=SERVE_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_transcriber if SERVE_PRELOAD else None,
+        )
+    if SERVE_PRELOAD:
+        await _run(_threads, _preload)
+        if _processes is not None:
+            # Start the pool now so Whisper is loaded before the first voice command
+            await asyncio.gather(*(_run(_processes, os.getpid) for _ in range(SERVE_PROCESSES)))
+    if not INGEST_IN_SUPERVISOR:
+        start_workers()
+    print(f"✅ Worker {os.getpid()} ready ({SERVE_THREADS} threads, {SERVE_REMOTE_THREADS} remote, "
+          f"{SERVE_PROCESSES} processes)")
+    try:
+        yield
+    finally:
+        # uvicorn has already drained in-flight requests; finish what the pools started
+        print(f"🛑 Worker {os.getpid()} shutting down")
+        _threads.shutdown(wait=True, cancel_futures=True)
+        _remote.shutdown(wait=True, cancel_futures=True)
+        if _processes is not None:
+            _processes.shutdown(wait=True, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route('/upload', upload_file, methods=['POST']),
+        Route('/jobs/{job_id}', job_status, methods=['GET']),
+        Route('/ask', ask_question, methods=['POST']),
+        Route('/ask/batch', ask_batch, methods=['POST']),
+        Route('/ask/stream', ask_question_stream, methods=['POST']),
+        Route('/patch', patch_machine, methods=['POST']),
+        Route('/patch/stream', patch_machine_stream, methods=['POST']),
+        Route('/patch/fleet', patch_fleet, methods=['POST']),
+        Route('/patch/{run_id}', get_patch_run, methods=['GET']),
+        Route('/process_audio', process_audio_route, methods=['POST']),
+        Route('/sources', list_sources, methods=['GET']),
+        Route('/sources/{source_id}', delete_source, methods=['DELETE']),
+        Route('/clear', clear_chroma_db, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
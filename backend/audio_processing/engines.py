@@ -0,0 +1,103 @@
+"""
+Whisper transcription engines.
+
+  whisper         - reference openai-whisper on PyTorch, fp32 (default)
+  faster-whisper  - CTranslate2 through faster-whisper, int8 on CPU by default
+
+Both take a 16 kHz mono float32 array (or a media path) plus the usual
+model.transcribe options and return the same result shape:
+{"text", "language", "segments": [{"start", "end", "text"}]}, so callers,
+the transcript cache and chunk_segments don't care which one ran.
+"""
+import os
+import numpy as np
+
+TRANSCRIBE_ENGINE = os.environ.get("TRANSCRIBE_ENGINE", "whisper")
+FASTER_WHISPER_COMPUTE_TYPE = os.environ.get("FASTER_WHISPER_COMPUTE_TYPE", "int8")
+# >1 decodes the 30 s chunks of one input as a batch (BatchedInferencePipeline)
+FASTER_WHISPER_BATCH_SIZE = int(os.environ.get("FASTER_WHISPER_BATCH_SIZE", "8"))
+
+ENGINES = ("whisper", "faster-whisper")
+CHUNK_SAMPLES = 30 * 16000  # Whisper's 30 s input window
+
+
+def _segment(start: float, end: float, text: str) -> dict:
+    return {"start": float(start), "end": float(end), "text": text}
+
+
+class WhisperEngine:
+    """Reference openai-whisper model."""
+
+    name = "whisper"
+
+    def __init__(self, model_name: str, threads: int = 0):
+        import torch
+        import whisper
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_name, device="cpu")
+
+    def transcribe(self, audio, **options) -> dict:
+        options.setdefault("fp16", False)  # CPU inference
+        result = self.model.transcribe(audio, **options)
+        return {
+            "text": result.get("text", ""),
+            "language": result.get("language"),
+            "segments": [_segment(s["start"], s["end"], s["text"]) for s in result.get("segments", [])],
+        }
+
+
+class FasterWhisperEngine:
+    """
+    faster-whisper (CTranslate2) model. Options are given in openai-whisper
+    terms and translated; ones faster-whisper has no equivalent for are dropped.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(
+        self,
+        model_name: str,
+        threads: int = 0,
+        compute_type: str = FASTER_WHISPER_COMPUTE_TYPE,
+        batch_size: int = FASTER_WHISPER_BATCH_SIZE,
+    ):
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+        self.model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=threads)
+        self.batch_size = batch_size
+        self.batched = BatchedInferencePipeline(model=self.model) if batch_size > 1 else None
+
+    @staticmethod
+    def _options(options: dict) -> dict:
+        opts = dict(options)
+        opts.pop("fp16", None)
+        opts.pop("verbose", None)
+        # openai-whisper uses None for greedy decoding; faster-whisper wants 1
+        if opts.get("beam_size", 1) is None:
+            opts["beam_size"] = 1
+        if opts.get("best_of", 1) is None:
+            opts.pop("best_of")
+        return opts
+
+    def transcribe(self, audio, **options) -> dict:
+        opts = self._options(options)
+        # Audio that fits in one 30 s chunk (voice commands, stream windows) gains nothing from batching
+        short = isinstance(audio, np.ndarray) and len(audio) <= CHUNK_SAMPLES
+        if self.batched is not None and not short:
+            # Batched decoding has no previous-text conditioning; chunks are independent
+            opts.pop("condition_on_previous_text", None)
+            segments, info = self.batched.transcribe(audio, batch_size=self.batch_size, **opts)
+        else:
+            segments, info = self.model.transcribe(audio, **opts)
+        # segments is a generator; decoding happens while it is consumed
+        segments = [_segment(s.start, s.end, s.text) for s in segments]
+        return {"text": "".join(s["text"] for s in segments), "language": info.language, "segments": segments}
+
+
+def load_transcription_engine(engine: str, model_name: str, threads: int = 0):
+    """Build the named engine for a Whisper model size (tiny, base, small, ...)."""
+    if engine == "whisper":
+        return WhisperEngine(model_name, threads)
+    if engine == "faster-whisper":
+        return FasterWhisperEngine(model_name, threads)
+    raise ValueError(f"Unknown transcription engine: {engine}")
@@ -1,9 +1,45 @@
 #Step 1: Extracting Audio from the video file.
 import ffmpeg
+import numpy as np
 
-def extract_audio(video_path, audio_path):
+SAMPLE_RATE = 16000  # what Whisper expects
+
+
+def _pcm_output(media_path, sr):
+    # 16 kHz mono float32 PCM on stdout, ready to use as a Whisper input array
+    return (
+        ffmpeg.input(media_path)
+        .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=sr)
+        .global_args("-nostdin", "-loglevel", "error")
+    )
+
+
+def decode_audio(media_path, sr=SAMPLE_RATE) -> np.ndarray:
+    """Decode any audio/video file straight to a float32 array, no temp WAV."""
     try:
-        ffmpeg.input(video_path).output(audio_path).run(overwrite_output=True)
-        print(f"✅ Audio extracted to {audio_path}  ")
+        out, _ = _pcm_output(media_path, sr).run(capture_stdout=True, capture_stderr=True)
     except ffmpeg.Error as e:
-        print("FFmpeg error:", e)
+        raise RuntimeError(f"FFmpeg failed to decode {media_path}: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(out, np.float32)
+
+
+def stream_audio_blocks(media_path, block_seconds=30, sr=SAMPLE_RATE):
+    """
+    Yield the decoded audio as float32 blocks of ~block_seconds while FFmpeg
+    is still running, so long files never sit fully in memory.
+    """
+    process = _pcm_output(media_path, sr).run_async(pipe_stdout=True)
+    block_bytes = int(block_seconds * sr) * 4
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            data = data[: len(data) - len(data) % 4]  # whole samples only
+            yield np.frombuffer(data, np.float32)
+        if process.wait() != 0:
+            raise RuntimeError(f"FFmpeg failed to decode {media_path} (exit {process.returncode})")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
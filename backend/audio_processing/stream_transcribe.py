@@ -0,0 +1,170 @@
+#Step 2 (streaming): Transcribe long audio in overlapping windows across a process pool.
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from audio_processing.extract_audio import SAMPLE_RATE, stream_audio_blocks
+from audio_processing.vad import join_regions, remap_segments, speech_regions
+from audio_processing.engines import FASTER_WHISPER_BATCH_SIZE, TRANSCRIBE_ENGINE
+from model_registry import WHISPER_MODEL_NAME, get_transcription_engine
+
+WINDOW_SECONDS = float(os.environ.get("TRANSCRIBE_WINDOW_SECONDS", "30"))
+OVERLAP_SECONDS = float(os.environ.get("TRANSCRIBE_OVERLAP_SECONDS", "4"))
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Send only the speech regions found by the energy VAD to Whisper
+TRANSCRIBE_VAD = os.environ.get("TRANSCRIBE_VAD", "1") == "1"
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def window_seconds(engine: str) -> float:
+    """
+    Default window length for an engine. Batched faster-whisper decodes the
+    30 s chunks of a window together, so it gets one window per batch.
+    """
+    if engine == "faster-whisper" and FASTER_WHISPER_BATCH_SIZE > 1:
+        return WINDOW_SECONDS * FASTER_WHISPER_BATCH_SIZE
+    return WINDOW_SECONDS
+
+
+def _init_worker(engine: str, model_name: str, threads: int) -> None:
+    """Pool initializer: split CPU threads between workers and load the engine once."""
+    get_transcription_engine(engine, model_name, threads)
+
+
+def _get_pool(workers: int, engine: str, model_name: str) -> ProcessPoolExecutor:
+    """Reuse one pool per (workers, engine, model) so each worker keeps its model loaded."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != (workers, engine, model_name):
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            threads = max(1, (os.cpu_count() or workers) // workers)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(engine, model_name, threads),
+            )
+            _pool_key = (workers, engine, model_name)
+        return _pool
+
+
+def transcribe_speech(
+    audio: np.ndarray, engine: str, model_name: str = None, vad: bool = TRANSCRIBE_VAD, **options
+) -> list:
+    """
+    Segments of a decoded array, timed from its first sample. With `vad`,
+    silence is cut out before Whisper runs (it tends to invent text there)
+    and the segment times are mapped back onto the original audio.
+    """
+    model = get_transcription_engine(engine, model_name)
+    if not vad:
+        return model.transcribe(audio, **options)["segments"]
+    regions = speech_regions(audio)
+    if not regions:
+        return []
+    speech, pieces = join_regions(audio, regions)
+    return remap_segments(model.transcribe(speech, **options)["segments"], pieces)
+
+
+def _transcribe_window(
+    audio, offset: float, keep_from: float, keep_to: float, engine: str, model_name: str, vad: bool, options: dict
+) -> list:
+    """
+    Transcribe one window and return segments shifted to global time.
+    Only segments whose midpoint falls inside [keep_from, keep_to) are kept,
+    so each overlapping region is owned by exactly one window.
+    """
+    segments = []
+    for seg in transcribe_speech(audio, engine, model_name, vad, **options):
+        start, end = seg["start"] + offset, seg["end"] + offset
+        mid = (start + end) / 2
+        if keep_from <= mid < keep_to:
+            segments.append({"start": start, "end": end, "text": seg["text"]})
+    return segments
+
+
+def iter_windows(blocks, window_s: float = WINDOW_SECONDS, overlap_s: float = OVERLAP_SECONDS):
+    """
+    Cut a stream of float32 blocks into overlapping windows.
+    Yields (samples, offset_s, keep_from_s, keep_to_s); only about one window
+    of audio is buffered at a time.
+    """
+    window = int(window_s * SAMPLE_RATE)
+    step = max(1, int((window_s - overlap_s) * SAMPLE_RATE))
+    half = overlap_s / 2
+    buf = np.zeros(0, dtype=np.float32)
+    start = 0  # global sample index of buf[0]
+
+    for block in blocks:
+        buf = np.concatenate([buf, block])
+        # More audio follows this window, so it isn't the last one
+        while len(buf) > window:
+            keep_from = 0.0 if start == 0 else start / SAMPLE_RATE + half
+            keep_to = (start + step) / SAMPLE_RATE + half
+            yield buf[:window].copy(), start / SAMPLE_RATE, keep_from, keep_to
+            buf = buf[step:]
+            start += step
+
+    if len(buf) or start == 0:
+        keep_from = 0.0 if start == 0 else start / SAMPLE_RATE + half
+        yield buf, start / SAMPLE_RATE, keep_from, float("inf")
+
+
+def transcribe_stream(
+    audio,
+    window_s: float = None,
+    overlap_s: float = OVERLAP_SECONDS,
+    workers: int = TRANSCRIBE_WORKERS,
+    model_name: str = None,
+    engine: str = None,
+    vad: bool = TRANSCRIBE_VAD,
+    **options,
+):
+    """
+    Yield Whisper segments ({start, end, text}) in order as windows complete.
+
+    Args:
+        audio: Path to a media file (decoded by FFmpeg as it is read), a 16 kHz
+            mono float32 NumPy array, or an iterable of such arrays
+        window_s (float, optional): Window length in seconds, defaults to window_seconds(engine)
+        overlap_s (float): Overlap between consecutive windows in seconds
+        workers (int): Pool size; 1 transcribes in this process
+        model_name (str, optional): Whisper model, defaults to the registry's
+        engine (str, optional): "whisper" or "faster-whisper", defaults to TRANSCRIBE_ENGINE
+        vad (bool): Skip the silence in each window (see transcribe_speech)
+        **options: Extra arguments for the engine's transcribe
+    """
+    engine = engine or TRANSCRIBE_ENGINE
+    window_s = window_s or window_seconds(engine)
+    if isinstance(audio, str):
+        blocks = stream_audio_blocks(audio, block_seconds=window_s)
+    elif isinstance(audio, np.ndarray):
+        blocks = [audio]
+    else:
+        blocks = audio
+
+    model_name = model_name or WHISPER_MODEL_NAME
+    windows = iter_windows(blocks, window_s, overlap_s)
+
+    if workers <= 1:
+        for samples, offset, keep_from, keep_to in windows:
+            yield from _transcribe_window(samples, offset, keep_from, keep_to, engine, model_name, vad, options)
+        return
+
+    # Keep a bounded number of windows in flight so memory stays flat on long files
+    pool = _get_pool(workers, engine, model_name)
+    pending = deque()
+    for samples, offset, keep_from, keep_to in windows:
+        pending.append(
+            pool.submit(_transcribe_window, samples, offset, keep_from, keep_to, engine, model_name, vad, options)
+        )
+        if len(pending) >= workers * 2:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
@@ -1,58 +1,85 @@
-import json
 import os
-import whisper
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
+from chunking import chunk_segments
+from audio_processing.extract_audio import decode_audio
+from audio_processing.engines import TRANSCRIBE_ENGINE
+from audio_processing.stream_transcribe import (
+    OVERLAP_SECONDS,
+    TRANSCRIBE_VAD,
+    transcribe_speech,
+    transcribe_stream,
+    window_seconds,
+)
+from audio_processing.transcript_cache import file_hash, get_transcript_cache, transcript_key
+from model_registry import WHISPER_MODEL_NAME
+from vectorstore import get_vectorstore
 
-def transcribe_audio(audio_path, json_path="output_audio.json"):
-    # === Step 2.1: Transcribe using Whisper module  ===
-    if not os.path.exists(json_path):
-        print("🔊 Running Whisper transcription...")
-        model = whisper.load_model("base")
-        result = model.transcribe(audio_path)
+STREAM_TRANSCRIBE = os.environ.get("TRANSCRIBE_STREAM", "1") == "1"
+USE_TRANSCRIPT_CACHE = os.environ.get("TRANSCRIPT_CACHE", "1") == "1"
 
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=4)
-    else:
-        print("📁 Found existing Whisper JSON")
 
-    # === Step 2.2: Load and process JSON ===
-    with open(json_path, "r", encoding="utf-8") as f:
-        whisper_data = json.load(f)
+def _whisper_segments(audio_path, stream, engine):
+    """Yield Whisper segments, from the transcript cache if this media was seen before."""
+    cache = key = None
+    if USE_TRANSCRIPT_CACHE and isinstance(audio_path, str):
+        options = {"stream": stream}
+        if stream:
+            options.update(window_s=window_seconds(engine), overlap_s=OVERLAP_SECONDS)
+        if engine != "whisper":
+            # Reference transcripts keep their original keys
+            options["engine"] = engine
+        if TRANSCRIBE_VAD:
+            options["vad"] = True
+        key = transcript_key(file_hash(audio_path), WHISPER_MODEL_NAME, options)
+        cache = get_transcript_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            print("📁 Found cached Whisper transcript")
+            yield from cached.get("segments", [])
+            return
 
-    segments = whisper_data.get("segments", [])
-    chunk_char_len, chunk_overlap = 700, 100
-    documents = []
+    print(f"🔊 Running Whisper transcription ({engine})...")
+    segments = []
+    if stream:
+        # Segments arrive window by window; pass them on while collecting for the cache
+        for segment in transcribe_stream(audio_path, engine=engine):
+            segments.append(segment)
+            yield segment
+    else:
+        audio = decode_audio(audio_path) if isinstance(audio_path, str) else audio_path
+        segments = transcribe_speech(audio, engine)
+        yield from segments
+
+    if cache is not None:
+        cache.put(key, {"text": "".join(s["text"] for s in segments), "segments": segments})
 
-    def split_text(segment):
-        text = segment["text"].strip()
-        duration = segment["end"] - segment["start"]
-        if len(text) <= chunk_char_len:
-            return [Document(page_content=text, metadata={"start": segment["start"], "end": segment["end"]})]
-
-        time_per_char = duration / len(text)
-        chunks = []
-        for i in range(0, len(text), chunk_char_len - chunk_overlap):
-            chunk_text = text[i:i+chunk_char_len]
-            est_start = segment["start"] + i * time_per_char
-            est_end = segment["start"] + min(i+chunk_char_len, len(text)) * time_per_char
-            chunks.append(Document(page_content=chunk_text.strip(), metadata={"start": est_start, "end": est_end}))
-        return chunks
-
-    for segment in segments:
-        documents.extend(split_text(segment))
-
-    # === Step 2.3: Store in ChromaDB ===
-    embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Create the Chroma vector store with persistence
-    vectorstore = Chroma.from_documents(
-    documents,
-    embedding,
-    persist_directory="chroma_db/database"  # Specify your desired directory
-)
-    print(f"✅ {len(documents)} timestamped chunks stored in ChromaDB!")
 
+def transcribe_audio(audio_path, stream=STREAM_TRANSCRIBE, metadata=None, engine=None):
+    """
+    Transcribe, chunk and store the media's speech in the vectorstore.
+    `metadata` (e.g. the source fields from ingest) is added to every chunk.
+    `engine` overrides TRANSCRIBE_ENGINE ("whisper" or "faster-whisper").
+    Returns the number of chunks stored.
+    """
+    # === Step 2.1: Transcribe using Whisper module  ===
+    segments = _whisper_segments(audio_path, stream, engine or TRANSCRIBE_ENGINE)
 
+    # === Step 2.2: Merge segments into token-sized chunks as they arrive ===
+    vectorstore = get_vectorstore()
+    extra = metadata or {}
+    documents = []
+    stored = 0
 
+    # === Step 2.3: Store in ChromaDB batch by batch, overlapping with transcription ===
+    for chunk in chunk_segments(segments):
+        documents.append(Document(
+            page_content=chunk["text"],
+            metadata={**extra, "start": chunk["start"], "end": chunk["end"]}
+        ))
+        if len(documents) >= vectorstore.batch_size:
+            stored += vectorstore.add_documents(documents)
+            documents = []
+    if documents:
+        stored += vectorstore.add_documents(documents)
+    print(f"✅ {stored} timestamped chunks stored in ChromaDB!")
+    return stored
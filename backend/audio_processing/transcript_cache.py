@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+TRANSCRIPT_CACHE_PATH = os.environ.get(
+    "TRANSCRIPT_CACHE_PATH", os.path.join(script_dir, "..", "chroma_db", "transcript_cache.sqlite")
+)
+TRANSCRIPT_CACHE_MAX_MB = int(os.environ.get("TRANSCRIPT_CACHE_MAX_MB", "256"))
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of the file's bytes, read in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def transcript_key(media_hash: str, model_name: str, options: dict) -> str:
+    """Cache key: media content + Whisper model + transcription options."""
+    opts = json.dumps(options or {}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{media_hash}|{model_name}|{opts}".encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Whisper results stored as zlib-compressed JSON in SQLite.
+
+    WAL mode plus a busy timeout lets several ingest workers read and write
+    the same file. Once the stored size passes `max_bytes`, the least
+    recently used transcripts are evicted. The stored size is kept in
+    `cache_stats` by triggers, so checking it is one row read.
+    """
+
+    def __init__(self, path: str = TRANSCRIPT_CACHE_PATH, max_bytes: int = TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    key       TEXT PRIMARY KEY,
+                    data      BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_last_used ON transcripts(last_used)")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache_stats (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                    "bytes INTEGER NOT NULL, rows INTEGER NOT NULL)"
+                )
+                # Seeded from one scan when the table is new (or predates cache_stats)
+                conn.execute(
+                    "INSERT OR IGNORE INTO cache_stats (id, bytes, rows) "
+                    "SELECT 0, COALESCE(SUM(LENGTH(data)), 0), COUNT(*) FROM transcripts"
+                )
+                for trigger in (
+                    "CREATE TRIGGER IF NOT EXISTS transcripts_ai AFTER INSERT ON transcripts BEGIN "
+                    "UPDATE cache_stats SET bytes = bytes + LENGTH(NEW.data), rows = rows + 1; END",
+                    "CREATE TRIGGER IF NOT EXISTS transcripts_ad AFTER DELETE ON transcripts BEGIN "
+                    "UPDATE cache_stats SET bytes = bytes - LENGTH(OLD.data), rows = rows - 1; END",
+                    "CREATE TRIGGER IF NOT EXISTS transcripts_au AFTER UPDATE OF data ON transcripts BEGIN "
+                    "UPDATE cache_stats SET bytes = bytes + LENGTH(NEW.data) - LENGTH(OLD.data); END",
+                ):
+                    conn.execute(trigger)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT data FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, key: str, result: dict) -> None:
+        data = zlib.compress(json.dumps(result, ensure_ascii=False).encode("utf-8"), 6)
+        with self._lock:
+            conn = self._connect()
+            # Upsert rather than REPLACE so the update trigger keeps cache_stats exact
+            conn.execute(
+                """
+                INSERT INTO transcripts (key, data, last_used) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET data = excluded.data, last_used = excluded.last_used
+                """,
+                (key, data, time.time()),
+            )
+            conn.commit()
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT bytes FROM cache_stats").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Transcripts vary a lot in size, so walk the LRU order only as far as
+        # needed to get back to ~90% of the budget
+        victims = []
+        for key, size in conn.execute("SELECT key, LENGTH(data) FROM transcripts ORDER BY last_used ASC"):
+            if total <= self.max_bytes * 0.9:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM transcripts WHERE key = ?", victims)
+        conn.commit()
+        print(f"🧹 Evicted {len(victims)} cached transcripts")
+
+
+_cache = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _cache
+    if _cache is None:
+        _cache = TranscriptCache()
+    return _cache
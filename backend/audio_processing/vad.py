@@ -0,0 +1,106 @@
+#Energy-based voice activity detection over decoded 16 kHz PCM.
+from bisect import bisect_right
+import numpy as np
+from audio_processing.extract_audio import SAMPLE_RATE
+
+FRAME_MS = 30
+THRESHOLD_DB = -40.0  # frames quieter than this (relative to full scale) count as silence
+NOISE_MARGIN_DB = 12.0  # speech must also stand this far above the recording's noise floor
+MIN_SPEECH_MS = 120  # shorter bursts (clicks, bumps) are ignored
+MIN_SILENCE_MS = 1000  # shorter pauses stay inside a region
+PAD_MS = 300  # margin kept around each region so word onsets aren't clipped
+GAP_MS = 200  # silence put between regions when they are joined for Whisper
+
+
+def frame_energy_db(audio: np.ndarray, sr: int = SAMPLE_RATE, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """RMS level in dBFS for each non-overlapping frame."""
+    frame = max(1, int(sr * frame_ms / 1000))
+    n = len(audio) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[: n * frame].reshape(n, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _voiced_runs(voiced: np.ndarray) -> np.ndarray:
+    """(start, end) frame index pairs of consecutive True runs."""
+    edges = np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]]))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+def speech_regions(
+    audio: np.ndarray,
+    sr: int = SAMPLE_RATE,
+    threshold_db: float = THRESHOLD_DB,
+    min_speech_ms: int = MIN_SPEECH_MS,
+    min_silence_ms: int = MIN_SILENCE_MS,
+    pad_ms: int = PAD_MS,
+) -> list:
+    """
+    [(start_sample, end_sample)] of the parts of `audio` that contain speech.
+
+    A frame is voiced when it is louder than threshold_db and NOISE_MARGIN_DB
+    above the noise floor (10th percentile of frame levels, capped below the
+    peak so a recording that is all speech keeps its quiet words). Regions are
+    padded by pad_ms and merged across pauses shorter than min_silence_ms.
+    """
+    levels = frame_energy_db(audio, sr)
+    if len(levels) == 0:
+        return []
+    frame = int(sr * FRAME_MS / 1000)
+    floor, peak = np.percentile(levels, 10), levels.max()
+    threshold = max(threshold_db, min(floor + NOISE_MARGIN_DB, peak - NOISE_MARGIN_DB))
+
+    min_speech = max(1, min_speech_ms // FRAME_MS)
+    pad = pad_ms // FRAME_MS
+    bridge = min_silence_ms // FRAME_MS
+    regions = []
+    for start, end in _voiced_runs(levels > threshold):
+        if end - start < min_speech:
+            continue
+        start, end = max(0, start - pad), min(len(levels), end + pad)
+        if regions and start - regions[-1][1] < bridge:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    out = [(int(start) * frame, int(end) * frame) for start, end in regions]
+    if out and regions[-1][1] == len(levels):
+        out[-1] = (out[-1][0], len(audio))  # keep the partial frame at the end
+    return out
+
+
+def join_regions(audio: np.ndarray, regions: list, sr: int = SAMPLE_RATE, gap_ms: int = GAP_MS):
+    """
+    Concatenate the speech regions with short gaps of silence between them.
+    Returns (speech_audio, pieces), where pieces are (joined_start_s,
+    original_start_s, duration_s) tuples for remap_segments.
+    """
+    gap = np.zeros(int(sr * gap_ms / 1000), dtype=np.float32)
+    parts, pieces, position = [], [], 0
+    for start, end in regions:
+        if parts:
+            parts.append(gap)
+            position += len(gap)
+        parts.append(audio[start:end])
+        pieces.append((position / sr, start / sr, (end - start) / sr))
+        position += end - start
+    speech = np.concatenate(parts).astype(np.float32, copy=False) if parts else np.zeros(0, dtype=np.float32)
+    return speech, pieces
+
+
+def remap_time(t: float, pieces: list) -> float:
+    """Map a time in the joined audio back to the original recording."""
+    i = max(0, bisect_right([p[0] for p in pieces], t) - 1)
+    joined_start, original_start, duration = pieces[i]
+    # Times inside a gap land on the end of the region before it
+    return original_start + min(max(t - joined_start, 0.0), duration)
+
+
+def remap_segments(segments: list, pieces: list) -> list:
+    """Whisper segments of the joined audio with start/end in original time."""
+    return [
+        {**seg, "start": remap_time(seg["start"], pieces), "end": remap_time(seg["end"], pieces)}
+        for seg in segments
+    ]
@@ -0,0 +1,96 @@
+"""
+/ask load test: concurrent clients posting questions, reporting throughput
+and latency percentiles.
+
+    LLM_BACKEND=fake ANSWER_CACHE=0 python serve.py
+    python benchmarks/ask_load.py --clients 50 --requests 2000
+
+With the fake LLM the numbers cover the serving path, retrieval and
+embedding but not a real model. ANSWER_CACHE=0 on the server keeps
+repeated questions from being answered from the cache.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+QUESTIONS = [
+    "How do I enable WinRM over HTTPS?",
+    "What does error 0x80070643 mean during an update?",
+    "Which patches need a reboot?",
+    "Summarize the maintenance schedule in the manual.",
+    "What was decided about the support tickets in the meeting?",
+    "How do I list pending Windows updates from PowerShell?",
+]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    counter = itertools.count()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client():
+        # One keep-alive connection per client, like a browser tab
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=args.timeout)
+        while True:
+            i = next(counter)
+            if i >= args.requests:
+                break
+            body = json.dumps({"query": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", "multimode": True})
+            started = time.perf_counter()
+            try:
+                conn.request("POST", "/ask", body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=args.timeout)
+                status = repr(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{args.requests} requests, {args.clients} clients, {wall:.1f} s")
+    print(f"throughput: {len(latencies) / wall:.1f} req/s ({len(errors)} errors)")
+    print(
+        "latency ms: "
+        + ", ".join(f"p{p} {percentile(latencies, p) * 1000:.0f}" for p in (50, 90, 99))
+        + f", max {latencies[-1] * 1000 if latencies else 0:.0f}"
+    )
+    if errors:
+        print(f"first errors: {errors[:5]}")
+
+
+if __name__ == "__main__":
+    main()
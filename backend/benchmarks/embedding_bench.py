@@ -0,0 +1,46 @@
+"""
+Embedding backend benchmark: chunk throughput per backend and cosine
+agreement with the fp32 torch model.
+
+    python benchmarks/embedding_bench.py --backends torch onnx onnx-int8 --texts 512
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from embedding_backends import AUTOTUNE_BATCH_SIZES, agreement, load_embedding_backend, sample_texts
+from model_registry import EMBEDDING_MODEL_NAME
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=512)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    reference = None
+    rates = {}
+    for name in args.backends:
+        print(f"== {name}")
+        backend = load_embedding_backend(args.model, name)
+        if reference is None:
+            reference = backend
+        started = time.perf_counter()
+        backend.embed_documents(texts)
+        rates[name] = len(texts) / (time.perf_counter() - started)
+        mean_cos, min_cos = agreement(reference, backend)
+        print(
+            f"{name:>10}: {rates[name]:,.0f} texts/s at batch {backend.batch_size}  "
+            f"({rates[name] / rates[args.backends[0]]:.2f}x {args.backends[0]}), "
+            f"cosine vs {args.backends[0]}: mean {mean_cos:.4f} min {min_cos:.4f}"
+        )
+    print(f"Batch sizes tried by autotune: {AUTOTUNE_BATCH_SIZES}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Lexical (BM25) index benchmark.
+
+Builds a throwaway index of synthetic transcript/PDF-like chunks and times
+LexicalIndex.search for queries containing rare exact tokens (KB numbers,
+error codes) and for plain-language queries.
+
+    python benchmarks/lexical_bench.py --chunks 1000000
+
+--index PATH keeps the built index, and reuses it on the next run, so query
+settings such as LEXICAL_MAX_POSTINGS can be compared without rebuilding.
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lexical_index import LexicalIndex
+from langchain_core.documents import Document
+
+WORDS_PER_CHUNK = 80
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocab = set()
+    while len(vocab) < size:
+        vocab.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(vocab)
+
+
+def make_chunk(rng: random.Random, vocab: list, weights: list, n: int) -> str:
+    words = rng.choices(vocab, cum_weights=weights, k=WORDS_PER_CHUNK)
+    # Roughly one chunk in ten mentions a KB number or an error code
+    if n % 10 == 0:
+        words.insert(rng.randrange(len(words)), f"KB{5000000 + n // 10}")
+    if n % 10 == 5:
+        words.insert(rng.randrange(len(words)), f"0x{0x80070000 + n // 10:08x}")
+    return " ".join(words)
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--batch", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index", help="index file to build once and reuse (default: temporary)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = make_vocabulary(rng, args.vocab)
+    # Zipf-like word frequencies, as in natural text
+    weights, total = [], 0.0
+    for rank in range(1, len(vocab) + 1):
+        total += 1.0 / rank
+        weights.append(total)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LexicalIndex(args.index or os.path.join(tmp, "lexical_index.sqlite"))
+
+        if index.is_empty():
+            started = time.time()
+            for start in range(0, args.chunks, args.batch):
+                docs, ids = [], []
+                for n in range(start, min(start + args.batch, args.chunks)):
+                    text = make_chunk(rng, vocab, weights, n)
+                    docs.append(Document(page_content=text, metadata={"source": f"doc-{n // 50}", "chunk": n}))
+                    ids.append(hashlib.sha256(text.encode("utf-8")).hexdigest())
+                index.add(ids, docs)
+            index.optimize()
+            build_s = time.time() - started
+            size_mb = os.path.getsize(index.path) / 1e6
+            print(f"Indexed {args.chunks} chunks in {build_s:.1f}s ({args.chunks / build_s:.0f} chunks/s), {size_mb:.0f} MB")
+        else:
+            print(f"Reusing {index.path} ({index.count()} chunks)")
+
+        print(f"Query budget: {index.max_postings} postings (LEXICAL_MAX_POSTINGS)")
+        mid = vocab[len(vocab) // 20 : len(vocab) // 2]
+        suites = {
+            "exact token": lambda: f"how do I fix KB{5000000 + rng.randrange(max(1, args.chunks // 10))} install",
+            "error code": lambda: f"error 0x{0x80070000 + rng.randrange(max(1, args.chunks // 10)):08x} during update",
+            "natural language": lambda: " ".join(rng.sample(mid, 4)),
+        }
+        for name, make_query in suites.items():
+            index.search(make_query(), args.k)  # warm the page cache
+            timings = []
+            for _ in range(args.queries):
+                query = make_query()
+                t0 = time.perf_counter()
+                index.search(query, args.k)
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(
+                f"{name:>16}: p50 {statistics.median(timings):.2f} ms  "
+                f"p95 {percentile(timings, 95):.2f} ms  p99 {percentile(timings, 99):.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Transcription engine benchmark: real-time factor per engine and word error
+rate against a reference transcript.
+
+    python benchmarks/transcribe_bench.py --clip sample.mp4 --reference sample.txt
+
+No clip ships with the repo; pass any audio or video file. Without
+--reference, WER is measured against the first engine's output.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_processing.engines import ENGINES
+from audio_processing.extract_audio import SAMPLE_RATE, decode_audio
+from model_registry import WHISPER_MODEL_NAME, get_transcription_engine
+
+
+def words(text: str) -> list:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """(substitutions + deletions + insertions) / reference words, by edit distance."""
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clip", required=True, help="audio or video file to transcribe")
+    parser.add_argument("--reference", help="text file with the correct transcript")
+    parser.add_argument("--model", default=WHISPER_MODEL_NAME)
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args()
+
+    audio = decode_audio(args.clip)
+    duration = len(audio) / SAMPLE_RATE
+    print(f"Clip: {args.clip} ({duration:.1f} s of audio)")
+    reference = None
+    against = args.reference or f"{args.engines[0]} output"
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = f.read()
+
+    for name in args.engines:
+        print(f"== {name}")
+        engine = get_transcription_engine(name, args.model)
+        engine.transcribe(audio[: SAMPLE_RATE * 5])  # warm up
+        best = float("inf")
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            result = engine.transcribe(audio)
+            best = min(best, time.perf_counter() - started)
+        if reference is None:
+            reference = result["text"]
+        print(
+            f"{name:>15}: {best:.1f} s, RTF {best / duration:.3f} "
+            f"({duration / best:.1f}x real time), {len(result['segments'])} segments, "
+            f"WER {word_error_rate(reference, result['text']):.2%} vs {against}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Sentence-aware, token-budgeted chunking shared by PDF/text and transcript ingestion.
+
+Text is split into sentences (transcripts into Whisper segments), each unit
+is tokenized once with the embedding model's tokenizer, and units are packed
+greedily into chunks of at most CHUNK_MAX_TOKENS tokens including the
+model's special tokens, so no chunk is silently truncated at embedding time.
+Only units longer than the budget are cut, and then at word boundaries.
+"""
+import os
+import re
+from typing import Iterable, Iterator, List
+from model_registry import get_tokenizer
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "256"))  # all-MiniLM-L6-v2 max_seq_length
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "32"))
+SPECIAL_TOKENS = 2  # [CLS] ... [SEP]
+MAX_PENDING_CHARS = 20000  # cut unpunctuated streams somewhere
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def _budget(max_tokens: int) -> int:
+    return max(8, max_tokens - SPECIAL_TOKENS)
+
+
+def _count(tokenizer, text: str) -> int:
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def _split_long(tokenizer, text: str, budget: int) -> List[tuple]:
+    """Cut text longer than the budget into (piece, n_tokens, char_start), preferring word starts."""
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    pieces = []
+    i = 0
+    while i < len(offsets):
+        j = min(i + budget, len(offsets))
+        if j < len(offsets):
+            # Back off to a token that starts a word, but never below half a chunk
+            k = j
+            while k > i + budget // 2 and not (offsets[k][0] > 0 and text[offsets[k][0] - 1].isspace()):
+                k -= 1
+            if k > i + budget // 2:
+                j = k
+        start = offsets[i][0]
+        end = offsets[j][0] if j < len(offsets) else len(text)
+        piece = text[start:end].strip()
+        if piece:
+            pieces.append((piece, j - i, start))
+        i = j
+    return pieces
+
+
+def _pack(units: Iterable[tuple], budget: int, overlap: int) -> Iterator[list]:
+    """
+    Greedily group (text, n_tokens, payload) units into lists totalling at most
+    `budget` tokens. Up to `overlap` tokens of trailing units are repeated at
+    the start of the next group. One pass; each unit is handled once.
+    """
+    current, size = [], 0
+    for unit in units:
+        n = unit[1]
+        if current and size + n > budget:
+            yield current
+            carry, carried = [], 0
+            for prev in reversed(current):
+                if carried + prev[1] > overlap:
+                    break
+                carry.insert(0, prev)
+                carried += prev[1]
+            while carry and carried + n > budget:
+                carried -= carry.pop(0)[1]
+            current, size = carry, carried
+        current.append(unit)
+        size += n
+    if current:
+        yield current
+
+
+def _sentence_units(tokenizer, sentences: Iterable[str], budget: int) -> Iterator[tuple]:
+    for sentence in sentences:
+        n = _count(tokenizer, sentence)
+        if n <= budget:
+            yield sentence, n, None
+        else:
+            for piece, pn, _ in _split_long(tokenizer, sentence, budget):
+                yield piece, pn, None
+
+
+def chunk_text(
+    text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS, tokenizer=None
+) -> Iterator[str]:
+    """Chunks of whole sentences, each within max_tokens model tokens."""
+    yield from chunk_stream([text], max_tokens, overlap_tokens, tokenizer)
+
+
+def chunk_stream(
+    blocks: Iterable[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    tokenizer=None,
+) -> Iterator[str]:
+    """chunk_text over text arriving in blocks (e.g. a large file read piecewise)."""
+    tokenizer = tokenizer or get_tokenizer()
+    budget = _budget(max_tokens)
+
+    def sentences():
+        pending = ""
+        for block in blocks:
+            parts = _SENTENCE_BREAK.split(pending + block)
+            # The last part may continue in the next block
+            pending = parts.pop() or ""
+            for part in parts:
+                if part and part.strip():
+                    yield part.strip()
+            if len(pending) > MAX_PENDING_CHARS:
+                cut = pending.rfind(" ", 0, MAX_PENDING_CHARS)
+                cut = cut if cut > 0 else MAX_PENDING_CHARS
+                yield pending[:cut].strip()
+                pending = pending[cut:]
+        if pending.strip():
+            yield pending.strip()
+
+    units = _sentence_units(tokenizer, sentences(), budget)
+    for group in _pack(units, budget, min(overlap_tokens, budget // 2)):
+        yield " ".join(u[0] for u in group)
+
+
+def chunk_segments(
+    segments: Iterable[dict], max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = 0, tokenizer=None
+) -> Iterator[dict]:
+    """
+    Merge consecutive Whisper segments ({start, end, text}) into chunks of at
+    most max_tokens tokens. Each chunk spans from its first segment's start to
+    its last segment's end; a segment longer than the budget is cut and its
+    time range divided in proportion to character position.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    budget = _budget(max_tokens)
+
+    def units():
+        for seg in segments:
+            text = seg["text"].strip()
+            if not text:
+                continue
+            n = _count(tokenizer, text)
+            if n <= budget:
+                yield text, n, (seg["start"], seg["end"])
+                continue
+            per_char = (seg["end"] - seg["start"]) / len(text)
+            for piece, pn, char_start in _split_long(tokenizer, text, budget):
+                start = seg["start"] + char_start * per_char
+                yield piece, pn, (start, min(seg["end"], start + len(piece) * per_char))
+
+    for group in _pack(units(), budget, min(overlap_tokens, budget // 2)):
+        yield {
+            "text": " ".join(u[0] for u in group),
+            "start": group[0][2][0],
+            "end": group[-1][2][1],
+        }
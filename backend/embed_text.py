@@ -1,19 +1,50 @@
 import os
-from typing import List, Dict
+from typing import Dict, Iterator
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from PyPDF2 import PdfReader
+from chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, chunk_stream, chunk_text
+from pdf_extract import iter_pdf_pages, iter_text_blocks
+from vectorstore import get_vectorstore
+
+
+def iter_documents(
+    file_path: str,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    metadata: Dict = None
+) -> Iterator[Document]:
+    """
+    Chunk Documents of a .txt or .pdf file, produced as the text is extracted.
+    Chunks are whole sentences packed up to the embedding model's token limit
+    and never cross a PDF page, so page_number stays exact.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == '.txt':
+        blocks = iter_text_blocks(file_path)
+        for idx, chunk in enumerate(chunk_stream(blocks, max_tokens, overlap_tokens)):
+            yield Document(page_content=chunk, metadata={**(metadata or {}), "chunk_index": idx})
+        return
+
+    # Pages come back in order from the extraction pool
+    for page_no, text in iter_pdf_pages(file_path):
+        for idx, chunk in enumerate(chunk_text(text, max_tokens, overlap_tokens)):
+            meta = {**(metadata or {}), "chunk_index": idx, "page_number": page_no}
+            yield Document(page_content=chunk, metadata=meta)
+
 
 def embed_text(
     file_path: str,
-    persist_directory: str = "chroma_db",
-    chunk_char_len: int = 1000,
-    chunk_overlap: int = 200
-) -> List[Dict]:
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    batch_size: int = None,
+    metadata: Dict = None
+) -> int:
     """
-    Read a text or PDF file, split into chunks, embed with SentenceTransformer,
-    persist in ChromaDB (automatically), and return list of JSON-serializable dicts.
+    Read a text or PDF file, split into chunks, embed with SentenceTransformer
+    and add to the shared ChromaDB store batch by batch while later pages are
+    still being extracted. Memory stays bounded by the batch size, not the file.
+    `metadata` (e.g. the source fields from ingest) is added to every chunk.
+    Returns the number of chunks stored.
     """
     if not os.path.isfile(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
@@ -22,46 +53,18 @@ def embed_text(
     if ext not in {'.txt', '.pdf'}:
         raise ValueError(f"Unsupported file type: {ext}")
 
-    # 1) Read and prepare
-    if ext == '.txt':
-        with open(file_path, 'r', encoding='utf-8') as f:
-            page_data = [(None, f.read())]
-    else:
-        reader = PdfReader(file_path)
-        page_data = [
-            (i + 1, page.extract_text() or "")
-            for i, page in enumerate(reader.pages)
-        ]
-
-    # 2) Split into overlapping chunks
-    def split_chunks(text: str):
-        step = chunk_char_len - chunk_overlap
-        return [
-            text[i : i + chunk_char_len].strip()
-            for i in range(0, len(text), step)
-            if text[i : i + chunk_char_len].strip()
-        ]
-
-    # 3) Build Document objects
-    documents = []
-    for page_no, text in page_data:
-        for idx, chunk in enumerate(split_chunks(text)):
-            meta = {"chunk_index": idx}
-            if page_no is not None:
-                meta["page_number"] = page_no
-            documents.append(Document(page_content=chunk, metadata=meta))
+    vectorstore = get_vectorstore()
+    batch_size = batch_size or vectorstore.batch_size
+    batch = []
+    stored = 0
 
-    # 4) Create & persist vectorstore in one go (no .persist() call needed)
-    embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    _ = Chroma.from_documents(
-        documents,
-        embedding,
-        persist_directory=persist_directory
-    )
-    print(f"✅ Stored {len(documents)} chunks in '{persist_directory}'")
+    for doc in iter_documents(file_path, max_tokens, overlap_tokens, metadata):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            stored += vectorstore.add_documents(batch, batch_size=batch_size)
+            batch = []
+    if batch:
+        stored += vectorstore.add_documents(batch, batch_size=batch_size)
 
-    # 5) Return JSON-serializable dicts
-    return [
-        {"text": doc.page_content, "metadata": doc.metadata}
-        for doc in documents
-    ]
+    print(f"✅ Stored {stored} chunks in '{vectorstore.persist_directory}'")
+    return stored
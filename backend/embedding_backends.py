@@ -0,0 +1,215 @@
+"""
+CPU embedding backends for the sentence-transformers model.
+
+  torch      - sentence-transformers on PyTorch, fp32 (default)
+  onnx       - ONNX Runtime, fp32 export from the model repo
+  onnx-int8  - ONNX Runtime, int8-quantized export from the model repo
+
+All backends produce the same mean-pooled, L2-normalized vectors as the
+sentence-transformers pipeline. The int8 backend is checked against the
+fp32 export when it loads; if the mean cosine agreement is below
+EMBED_AGREEMENT_MIN it is not used.
+
+Batch size is EMBED_BATCH_SIZE (32). EMBED_BATCH_SIZE=auto measures the
+best size instead; the result is kept in EMBED_AUTOTUNE_CACHE per model,
+backend and CPU layout, so only the first process on a machine pays for it.
+"""
+import json
+import os
+import time
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", "0"))  # 0 = library default
+EMBED_BATCH_SIZE = os.environ.get("EMBED_BATCH_SIZE", "32")  # a number, or "auto" to measure once
+EMBED_MAX_LENGTH = int(os.environ.get("EMBED_MAX_LENGTH", "256"))
+EMBED_AGREEMENT_MIN = float(os.environ.get("EMBED_AGREEMENT_MIN", "0.99"))
+ONNX_FP32_FILE = os.environ.get("ONNX_FP32_FILE", "onnx/model.onnx")
+ONNX_INT8_FILE = os.environ.get("ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+AUTOTUNE_BATCH_SIZES = (8, 16, 32, 64, 128)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+EMBED_AUTOTUNE_CACHE = os.environ.get(
+    "EMBED_AUTOTUNE_CACHE", os.path.join(script_dir, "chroma_db", "embed_batch_size.json")
+)
+
+_SAMPLE_SENTENCES = [
+    "Install the cumulative update and restart the server when the installer asks for it.",
+    "The video shows how to configure WinRM over HTTPS with a self-signed certificate.",
+    "Error 0x80070643 means the update could not be installed because of a fatal error.",
+    "In this meeting we reviewed the quarterly roadmap and the open support tickets.",
+    "Open PowerShell as administrator and run Get-WindowsUpdate to list pending patches.",
+    "The PDF manual describes the maintenance schedule for every component in chapter four.",
+]
+
+
+def sample_texts(count: int = 64) -> List[str]:
+    """Deterministic chunk-sized texts (about 100-200 tokens) for tuning and checks."""
+    texts = []
+    n = len(_SAMPLE_SENTENCES)
+    for i in range(count):
+        k = 3 + i % 6
+        texts.append(" ".join(_SAMPLE_SENTENCES[(i + j) % n] for j in range(k)))
+    return texts
+
+
+def _hub_repo(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class BatchedEmbeddings(Embeddings):
+    """Base class: subclasses implement _encode(texts, batch_size) -> float32 array."""
+
+    name = "base"
+    batch_size = 32
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(list(texts), self.batch_size).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def autotune(self, texts: List[str] = None, candidates=AUTOTUNE_BATCH_SIZES) -> int:
+        """
+        Time each batch size on sample chunks and keep the fastest. Stops once
+        throughput has fallen for two sizes in a row.
+        """
+        texts = texts or sample_texts(max(candidates) * 2)
+        self._encode(texts[: min(candidates)], min(candidates))  # warm up kernels / allocations
+        best, best_rate, worse = self.batch_size, 0.0, 0
+        for size in candidates:
+            started = time.perf_counter()
+            self._encode(texts, size)
+            rate = len(texts) / (time.perf_counter() - started)
+            print(f"   batch {size:>4}: {rate:,.0f} texts/s")
+            if rate > best_rate:
+                best, best_rate, worse = size, rate, 0
+            else:
+                worse += 1
+                if worse >= 2:
+                    break
+        self.batch_size = best
+        print(f"✅ {self.name} embedding batch size: {best} ({best_rate:,.0f} texts/s)")
+        return best
+
+
+class TorchEmbeddings(BatchedEmbeddings):
+    name = "torch"
+
+    def __init__(self, model_name: str, threads: int = EMBED_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.max_seq_length = min(self.model.max_seq_length, EMBED_MAX_LENGTH)
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+
+
+class OnnxEmbeddings(BatchedEmbeddings):
+    """
+    ONNX Runtime session over the model repo's ONNX export, with the
+    tokenizer and mean pooling + normalization done here.
+    """
+
+    def __init__(self, model_name: str, file_name: str = ONNX_FP32_FILE, threads: int = EMBED_THREADS):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from model_registry import get_tokenizer
+
+        self.name = "onnx-int8" if file_name == ONNX_INT8_FILE else "onnx"
+        path = hf_hub_download(_hub_repo(model_name), file_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = get_tokenizer(model_name)
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        # Batch texts of similar length together so little time goes to padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            idx = order[start : start + batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True, max_length=EMBED_MAX_LENGTH, return_tensors="np"
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            tokens = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if out.shape[1] == 0:
+                out = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[idx] = pooled
+        return out
+
+
+def agreement(reference: BatchedEmbeddings, candidate: BatchedEmbeddings, texts: List[str] = None) -> tuple:
+    """(mean, min) cosine similarity between two backends' vectors for the same texts."""
+    texts = texts or sample_texts(32)
+    a = reference._encode(texts, 16)
+    b = candidate._encode(texts, 16)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cos = (a * b).sum(axis=1)
+    return float(cos.mean()), float(cos.min())
+
+
+def load_embedding_backend(model_name: str, backend: str = EMBEDDING_BACKEND) -> BatchedEmbeddings:
+    """
+    Build the named backend, falling back to fp32 when the int8 model's
+    agreement check fails, then pick its batch size.
+    """
+    if backend == "torch":
+        embedding = TorchEmbeddings(model_name)
+    elif backend == "onnx":
+        embedding = OnnxEmbeddings(model_name, ONNX_FP32_FILE)
+    elif backend == "onnx-int8":
+        embedding = OnnxEmbeddings(model_name, ONNX_INT8_FILE)
+        reference = OnnxEmbeddings(model_name, ONNX_FP32_FILE)
+        mean_cos, min_cos = agreement(reference, embedding)
+        print(f"🔎 int8 vs fp32 cosine agreement: mean {mean_cos:.4f}, min {min_cos:.4f}")
+        if mean_cos < EMBED_AGREEMENT_MIN:
+            print(f"⚠️ int8 agreement below {EMBED_AGREEMENT_MIN}; using the fp32 ONNX model instead")
+            embedding = reference
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if EMBED_BATCH_SIZE == "auto":
+        embedding.batch_size = _tuned_batch_size(embedding, model_name)
+    else:
+        embedding.batch_size = int(EMBED_BATCH_SIZE)
+    return embedding
+
+
+def _tuned_batch_size(embedding: BatchedEmbeddings, model_name: str) -> int:
+    """Autotuned batch size from EMBED_AUTOTUNE_CACHE, measuring and saving it on a miss."""
+    key = f"{model_name}|{embedding.name}|threads={EMBED_THREADS}|cpus={os.cpu_count()}"
+    try:
+        with open(EMBED_AUTOTUNE_CACHE, "r", encoding="utf-8") as f:
+            tuned = json.load(f)
+    except (OSError, ValueError):
+        tuned = {}
+    if key in tuned:
+        print(f"✅ {embedding.name} embedding batch size: {tuned[key]} (autotuned earlier)")
+        return int(tuned[key])
+
+    tuned[key] = embedding.autotune()
+    os.makedirs(os.path.dirname(EMBED_AUTOTUNE_CACHE), exist_ok=True)
+    # Written whole and renamed, so a process reading concurrently never sees half a file
+    tmp = f"{EMBED_AUTOTUNE_CACHE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(tuned, f, indent=2, sort_keys=True)
+    os.replace(tmp, EMBED_AUTOTUNE_CACHE)
+    return tuned[key]
@@ -0,0 +1,212 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+EMBED_CACHE_PATH = os.environ.get(
+    "EMBED_CACHE_PATH", os.path.join(script_dir, "chroma_db", "embedding_cache.sqlite")
+)
+EMBED_CACHE_MAX_MB = int(os.environ.get("EMBED_CACHE_MAX_MB", "512"))
+# Reads bump last_used in memory; it is written back after this many hits or seconds
+LRU_FLUSH_EVERY = 256
+LRU_FLUSH_SECONDS = 60
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of the chunk text, used as the cache key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding store keyed by (model name, SHA-256 of text).
+
+    Vectors are stored as packed float32 blobs in SQLite (WAL mode, so
+    several workers can share the file). When the stored vectors exceed
+    `max_bytes`, the least recently used entries are evicted. The stored
+    size is kept in `cache_stats` by triggers, so checking it is one row read.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_bytes: int = EMBED_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._touched = {}  # (model, hash) -> last read time, not yet written
+        self._flushed_at = time.time()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model     TEXT NOT NULL,
+                    hash      TEXT NOT NULL,
+                    vector    BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache_stats (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                    "bytes INTEGER NOT NULL, rows INTEGER NOT NULL)"
+                )
+                # Seeded from one scan when the table is new (or predates cache_stats)
+                conn.execute(
+                    "INSERT OR IGNORE INTO cache_stats (id, bytes, rows) "
+                    "SELECT 0, COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings"
+                )
+                # Separate statements so the seed and triggers share one transaction
+                for trigger in (
+                    "CREATE TRIGGER IF NOT EXISTS embeddings_ai AFTER INSERT ON embeddings BEGIN "
+                    "UPDATE cache_stats SET bytes = bytes + LENGTH(NEW.vector), rows = rows + 1; END",
+                    "CREATE TRIGGER IF NOT EXISTS embeddings_ad AFTER DELETE ON embeddings BEGIN "
+                    "UPDATE cache_stats SET bytes = bytes - LENGTH(OLD.vector), rows = rows - 1; END",
+                    "CREATE TRIGGER IF NOT EXISTS embeddings_au AFTER UPDATE OF vector ON embeddings BEGIN "
+                    "UPDATE cache_stats SET bytes = bytes + LENGTH(NEW.vector) - LENGTH(OLD.vector); END",
+                ):
+                    conn.execute(trigger)
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, hashes: List[str]) -> dict:
+        """
+        Return {hash: vector} for the hashes that are cached. Their LRU time
+        is bumped in memory and written back in batches, so reads stay reads.
+        """
+        found = {}
+        if not hashes:
+            return found
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            conn = self._connect()
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i : i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({marks})",
+                    [model, *batch],
+                ).fetchall()
+                for h, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[h] = vec.tolist()
+            if found:
+                now = time.time()
+                self._touched.update(((model, h), now) for h in found)
+                if len(self._touched) >= LRU_FLUSH_EVERY or now - self._flushed_at >= LRU_FLUSH_SECONDS:
+                    self._flush_touched(conn)
+                    conn.commit()
+        return found
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        if self._touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                [(t, model, h) for (model, h), t in self._touched.items()],
+            )
+            self._touched.clear()
+        self._flushed_at = time.time()
+
+    def put_many(self, model: str, items: dict) -> None:
+        """Store {hash: vector} and evict old entries if over budget."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # Upsert rather than REPLACE so the update trigger keeps cache_stats exact
+            conn.executemany(
+                """
+                INSERT INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT (model, hash) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used
+                """,
+                [(model, h, array("f", vec).tobytes(), now) for h, vec in items.items()],
+            )
+            # Pending read times go out with this write, before eviction looks at them
+            self._flush_touched(conn)
+            conn.commit()
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total, count = conn.execute("SELECT bytes, rows FROM cache_stats").fetchone()
+        if total <= self.max_bytes or not count:
+            return
+        # Drop the least recently used rows down to ~90% of the budget
+        avg = total / count
+        excess = int((total - self.max_bytes * 0.9) / avg) + 1
+        conn.execute(
+            """
+            DELETE FROM embeddings WHERE rowid IN (
+                SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (excess,),
+        )
+        conn.commit()
+        print(f"🧹 Evicted {excess} cached embeddings")
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+            self._touched.clear()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that only runs the model on cache misses.
+    Identical texts within one call are embedded once.
+    """
+
+    def __init__(self, embedding: Embeddings, model_name: str, cache: EmbeddingCache = None):
+        self.embedding = embedding
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+
+    def _embed(self, namespace: str, texts: List[str], embed_fn) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        vectors = self.cache.get_many(namespace, hashes)
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in vectors and h not in missing:
+                missing[h] = t
+        if missing:
+            computed = embed_fn(list(missing.values()))
+            new = dict(zip(missing.keys(), computed))
+            self.cache.put_many(namespace, new)
+            vectors.update(new)
+
+        return [vectors[h] for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(self.model_name, texts, self.embedding.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries get their own namespace in case the model treats them differently
+        return self._embed(
+            f"{self.model_name}:query", [text], lambda ts: [self.embedding.embed_query(ts[0])]
+        )[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Many queries in one forward pass, cached like embed_query. Sentence-
+        transformer models embed a query the same way as a document, so the
+        batch goes through embed_documents.
+        """
+        return self._embed(f"{self.model_name}:query", texts, self.embedding.embed_documents)
@@ -0,0 +1,78 @@
+import os
+from audio_processing.transcribe_whisper import transcribe_audio
+from audio_processing.transcript_cache import file_hash
+from embed_text import embed_text
+from vectorstore import get_vectorstore
+
+# Allowed extensions
+VIDEO_EXTS = {'.mp4', '.mkv'}
+AUDIO_EXTS = {'.mp3'}
+TEXT_EXTS = {'.txt', '.pdf'}
+SUPPORTED_EXTS = VIDEO_EXTS | AUDIO_EXTS | TEXT_EXTS
+
+
+def _noop_report(stage: str, progress: float = None) -> None:
+    pass
+
+
+def describe_source(file_path: str, filename: str = None) -> dict:
+    """
+    Source record for an upload. The ID comes from the content hash, so
+    uploading the same bytes again replaces the earlier chunks. `filename`
+    is the name it was uploaded as (defaults to the saved file's name).
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in VIDEO_EXTS:
+        media_type = 'video'
+    elif ext in AUDIO_EXTS:
+        media_type = 'audio'
+    else:
+        media_type = ext.lstrip('.')  # 'pdf' / 'txt'
+    content_hash = file_hash(file_path)
+    return {
+        'source_id': content_hash[:16],
+        'filename': filename or os.path.basename(file_path),
+        'media_type': media_type,
+        'content_hash': content_hash,
+    }
+
+
+def ingest_file(file_path: str, filename: str = None, report=None) -> dict:
+    """
+    Run the full ingestion pipeline for an uploaded file.
+
+    Args:
+        file_path (str): Path to the saved upload
+        filename (str, optional): Original upload name, recorded as the source's
+            filename (the saved file carries a job-unique prefix)
+        report (callable, optional): report(stage, progress) called as each
+            stage starts; progress is a 0..1 fraction of the whole job
+
+    Returns:
+        dict: Type, chunk count and the source record ({'source_id', 'filename',
+            'media_type', 'content_hash'})
+    """
+    report = report or _noop_report
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in SUPPORTED_EXTS:
+        raise ValueError(f'Unsupported file type: {ext}')
+
+    source = describe_source(file_path, filename)
+    # Chunks are tagged so /ask can filter by file or type and one file can be deleted alone
+    chunk_meta = {k: source[k] for k in ('source_id', 'filename', 'media_type')}
+    vectorstore = get_vectorstore()
+    if vectorstore.get_source(source['source_id']) is not None:
+        print(f"♻️ Replacing earlier chunks of {source['filename']}")
+        vectorstore.delete_source(source['source_id'])
+
+    if ext in VIDEO_EXTS or ext in AUDIO_EXTS:
+        # FFmpeg decodes the audio track straight into Whisper (no temp WAV)
+        report('transcribe', 0.0)
+        count = transcribe_audio(file_path, metadata=chunk_meta)
+        vectorstore.register_source(source, count)
+        return {'type': 'video' if ext in VIDEO_EXTS else 'audio', 'count': count, 'source': source}
+
+    report('embed', 0.0)
+    count = embed_text(file_path, metadata=chunk_meta)
+    vectorstore.register_source(source, count)
+    return {'type': 'text', 'count': count, 'source': source}
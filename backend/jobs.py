@@ -0,0 +1,278 @@
+import atexit
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(script_dir, "uploads", "jobs.sqlite"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+POLL_INTERVAL = float(os.environ.get("INGEST_POLL_INTERVAL", "0.5"))
+# Seconds shutdown waits for a worker to finish its current job before terminating it
+INGEST_STOP_TIMEOUT = float(os.environ.get("INGEST_STOP_TIMEOUT", "10"))
+# Keep uploaded files in uploads/ after their job finishes (default: delete them)
+INGEST_KEEP_UPLOADS = os.environ.get("INGEST_KEEP_UPLOADS", "0") == "1"
+
+# Spawned (not forked) so workers don't inherit the server's open Chroma/SQLite handles
+_mp = multiprocessing.get_context("spawn")
+
+
+class JobQueue:
+    """
+    SQLite-backed ingestion queue; no external broker needed.
+
+    Jobs move queued -> running -> done | failed. Claiming a job runs in an
+    IMMEDIATE transaction so two workers never pick up the same row.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._db() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id          TEXT PRIMARY KEY,
+                    kind        TEXT NOT NULL,
+                    payload     TEXT NOT NULL,
+                    status      TEXT NOT NULL,
+                    stage       TEXT,
+                    progress    REAL NOT NULL DEFAULT 0,
+                    timings     TEXT NOT NULL DEFAULT '{}',
+                    result      TEXT,
+                    error       TEXT,
+                    worker_pid  INTEGER,
+                    created_at  REAL NOT NULL,
+                    started_at  REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        # Autocommit connection, closed when the block ends
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker_pid: int):
+        """Atomically take the oldest queued job, or return None."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ? WHERE id = ?",
+                (worker_pid, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+            return dict(row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def update_stage(self, job_id: str, stage: str, progress: float = None, timings: dict = None) -> None:
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, progress = COALESCE(?, progress), timings = ? WHERE id = ?",
+                (stage, progress, json.dumps(timings or {}), job_id),
+            )
+
+    def finish(self, job_id: str, result: dict = None, error: str = None, timings: dict = None) -> None:
+        status = "failed" if error else "done"
+        with self._db() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, stage = NULL, progress = COALESCE(?, progress), result = ?, error = ?,
+                       timings = ?, finished_at = ?
+                WHERE id = ?
+                """,
+                (
+                    status,
+                    1.0 if not error else None,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    json.dumps(timings or {}),
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def get(self, job_id: str):
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["timings"] = json.loads(job["timings"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def requeue_orphans(self) -> int:
+        """Put back 'running' jobs whose worker process no longer exists."""
+        requeued = 0
+        with self._db() as conn:
+            rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if row["worker_pid"] and _pid_alive(row["worker_pid"]):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_pid = NULL, stage = NULL WHERE id = ?",
+                    (row["id"],),
+                )
+                requeued += 1
+        return requeued
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+# -------------------- Worker --------------------
+def _run_job(queue: JobQueue, job: dict) -> None:
+    from ingest import ingest_file
+
+    job_id = job["id"]
+    payload = json.loads(job["payload"])
+    timings = {}
+    current = {"stage": None, "started": None}
+
+    def report(stage: str, progress: float = None):
+        now = time.time()
+        if current["stage"]:
+            timings[current["stage"]] = round(now - current["started"], 3)
+        current["stage"], current["started"] = stage, now
+        queue.update_stage(job_id, stage, progress, timings)
+
+    try:
+        result = ingest_file(payload["file_path"], filename=payload.get("filename"), report=report)
+        if current["stage"]:
+            timings[current["stage"]] = round(time.time() - current["started"], 3)
+        queue.finish(job_id, result=result, timings=timings)
+        print(f"✅ Job {job_id} done in {sum(timings.values()):.1f}s")
+    except Exception as e:
+        traceback.print_exc()
+        if current["stage"]:
+            timings[current["stage"]] = round(time.time() - current["started"], 3)
+        queue.finish(job_id, error=f"{current['stage'] or 'ingest'}: {e}", timings=timings)
+    # A job killed mid-way never gets here, so its requeued retry still finds the file
+    if not INGEST_KEEP_UPLOADS:
+        try:
+            os.remove(payload["file_path"])
+        except FileNotFoundError:
+            pass
+
+
+def worker_loop(db_path: str = JOBS_DB_PATH, stop_event=None) -> None:
+    """Drain the queue forever (or until stop_event is set)."""
+    queue = JobQueue(db_path)
+    pid = os.getpid()
+    print(f"👷 Ingest worker {pid} started")
+    while stop_event is None or not stop_event.is_set():
+        job = queue.claim(pid)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        _run_job(queue, job)
+
+
+_queue = None
+_workers = []
+_stop_event = None
+_atexit_registered = False
+_workers_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+def start_workers(count: int = INGEST_WORKERS) -> None:
+    """Start ingest worker processes once per server process."""
+    global _stop_event, _atexit_registered
+    with _workers_lock:
+        alive = [p for p in _workers if p.is_alive()]
+        if len(alive) >= count:
+            return
+        if _stop_event is None:
+            _stop_event = _mp.Event()
+        requeued = get_job_queue().requeue_orphans()
+        if requeued:
+            print(f"♻️ Requeued {requeued} orphaned ingest jobs")
+        _workers[:] = alive
+        for _ in range(count - len(alive)):
+            # Not daemonic: workers start their own process pools (Whisper windows),
+            # which daemonic processes may not do. stop_workers runs at exit instead.
+            p = _mp.Process(target=worker_loop, args=(get_job_queue().path, _stop_event))
+            p.start()
+            _workers.append(p)
+        if not _atexit_registered:
+            atexit.register(stop_workers)
+            _atexit_registered = True
+
+
+def stop_workers(timeout: float = INGEST_STOP_TIMEOUT) -> None:
+    """
+    Ask workers to exit after their current job; any still running after
+    `timeout` seconds are terminated. Their job stays 'running' with a dead
+    PID, so the next start_workers requeues it.
+    """
+    global _stop_event
+    with _workers_lock:
+        if _stop_event is not None:
+            _stop_event.set()
+        deadline = time.monotonic() + timeout
+        for p in _workers:
+            p.join(max(0.0, deadline - time.monotonic()))
+        for p in _workers:
+            if p.is_alive():
+                print(f"⚠️ Ingest worker {p.pid} still busy after {timeout:g}s, terminating")
+                p.terminate()
+                p.join(5)
+        _workers.clear()
+        _stop_event = None
+
+
+def enqueue_ingest(file_path: str, filename: str = None) -> str:
+    """Queue an uploaded file for ingestion (`filename`: name it was uploaded as); starts workers lazily."""
+    start_workers()
+    return get_job_queue().enqueue("ingest", {"file_path": file_path, "filename": filename})
@@ -0,0 +1,183 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import List
+from langchain_core.documents import Document
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+LEXICAL_INDEX_PATH = os.environ.get(
+    "LEXICAL_INDEX_PATH", os.path.join(script_dir, "chroma_db", "lexical_index.sqlite")
+)
+
+# BM25 ranking costs a few microseconds per matching chunk, so a query ranks at
+# most this many postings: terms are taken rarest (highest IDF) first until the
+# budget is spent. Common terms add little to BM25 and the dense ranking still sees them.
+LEXICAL_MAX_POSTINGS = int(os.environ.get("LEXICAL_MAX_POSTINGS", "1500"))
+
+# Chunk metadata fields searches can be filtered on; the only metadata kept here
+FILTER_FIELDS = ("source_id", "media_type", "filename")
+
+# Words that match most chunks: they cost posting-list reads and add nothing to BM25
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its of on or
+so that the their there this to was what when where which who why will with you your
+""".split())
+
+
+def query_terms(query: str) -> List[str]:
+    """Lowercased word tokens of the query, stopwords and duplicates removed."""
+    terms = []
+    for word in re.findall(r"\w+", query.lower()):
+        if word not in STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def _rowid(chunk_id: str) -> int:
+    # Chunk IDs are SHA-256 hex; 60 bits of it make a stable rowid for O(log n) upserts
+    return int(chunk_id[:15], 16)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index of the chunks in the vectorstore (SQLite FTS5).
+
+    Kept next to Chroma and written by the same add/reset calls, so exact
+    tokens such as KB numbers, error codes and product names can be found
+    even when the embedding model does not place them near the query.
+
+    The FTS5 table is contentless: it holds the postings only, not a second
+    copy of every chunk. A slim side table maps its rowids to chunk IDs and
+    the filter fields; searches return chunk IDs and the caller reads the
+    text from Chroma. Removing a chunk from a contentless table takes its
+    original text, so delete() is given the texts as well.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH, max_postings: int = LEXICAL_MAX_POSTINGS):
+        self.path = path
+        self.max_postings = max_postings
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks'").fetchone():
+                # Earlier layout stored the text and metadata too; it is rebuilt from Chroma
+                print("🔎 Dropping the old lexical index layout (full-text copy)...")
+                conn.execute("DROP TABLE IF EXISTS chunks_vocab")
+                conn.execute("DROP TABLE chunks")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(text, content = '', tokenize = 'unicode61')"
+            )
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS chunk_keys (
+                    rowid    INTEGER PRIMARY KEY,
+                    chunk_id TEXT NOT NULL,
+                    {", ".join(f"{field} TEXT" for field in FILTER_FIELDS)}
+                )
+                """
+            )
+            # Per-term document counts, read before each query to skip over-common terms
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms_vocab USING fts5vocab(chunk_terms, 'row')")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add(self, ids: List[str], documents: List[Document]) -> None:
+        """Insert chunks by ID; IDs already indexed are skipped (same ID, same text)."""
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            for cid, doc in zip(ids, documents):
+                meta = doc.metadata or {}
+                cur = conn.execute(
+                    f"INSERT OR IGNORE INTO chunk_keys (rowid, chunk_id, {', '.join(FILTER_FIELDS)}) "
+                    f"VALUES (?, ?, {', '.join('?' * len(FILTER_FIELDS))})",
+                    (_rowid(cid), cid, *(_field(meta.get(f)) for f in FILTER_FIELDS)),
+                )
+                if cur.rowcount:
+                    conn.execute("INSERT INTO chunk_terms (rowid, text) VALUES (?, ?)", (_rowid(cid), doc.page_content))
+            conn.commit()
+
+    def delete(self, ids: List[str], texts: List[str]) -> None:
+        """Remove chunks; `texts` must be the texts they were indexed with (see the class docstring)."""
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            for cid, text in zip(ids, texts):
+                if conn.execute("DELETE FROM chunk_keys WHERE rowid = ?", (_rowid(cid),)).rowcount:
+                    conn.execute(
+                        "INSERT INTO chunk_terms (chunk_terms, rowid, text) VALUES ('delete', ?, ?)", (_rowid(cid), text)
+                    )
+            conn.commit()
+
+    def search(self, query: str, k: int = 10, filters: dict = None) -> List[str]:
+        """
+        Best BM25 matches for any of the query terms, optionally limited to
+        chunks whose filter fields match `filters` ({field: [allowed values]}).
+        Returns chunk IDs in rank order.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            conn = self._connect()
+            marks = ",".join("?" * len(terms))
+            df = dict(conn.execute(f"SELECT term, doc FROM chunk_terms_vocab WHERE term IN ({marks})", terms).fetchall())
+            if not df:
+                return []
+            # The rarest term is always kept, so an all-common query still matches something
+            kept, postings = [], 0
+            for term in sorted(df, key=df.get):
+                if kept and postings + df[term] > self.max_postings:
+                    break
+                kept.append(term)
+                postings += df[term]
+            match = " OR ".join(f'"{t}"' for t in kept)
+            where, args = "chunk_terms MATCH ?", [match]
+            for field, values in (filters or {}).items():
+                if values and field in FILTER_FIELDS:
+                    where += f" AND k.{field} IN ({','.join('?' * len(values))})"
+                    args.extend(values)
+            rows = conn.execute(
+                f"""
+                SELECT k.chunk_id FROM chunk_terms JOIN chunk_keys k ON k.rowid = chunk_terms.rowid
+                WHERE {where} ORDER BY chunk_terms.rank LIMIT ?
+                """,
+                (*args, k),
+            ).fetchall()
+        return [cid for (cid,) in rows]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM chunk_keys LIMIT 1").fetchone() is None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM chunk_keys").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT INTO chunk_terms (chunk_terms) VALUES ('delete-all')")
+            conn.execute("DELETE FROM chunk_keys")
+            conn.commit()
+
+    def optimize(self) -> None:
+        """Merge FTS5 segments; worth running after a large bulk load."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT INTO chunk_terms (chunk_terms) VALUES ('optimize')")
+            conn.commit()
+
+
+def _field(value):
+    return None if value is None else str(value)
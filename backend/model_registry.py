@@ -0,0 +1,90 @@
+import os
+import threading
+
+# Default model names (override through the environment)
+WHISPER_MODEL_NAME = os.environ.get("WHISPER_MODEL", "base")
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+USE_EMBED_CACHE = os.environ.get("EMBED_CACHE", "1") == "1"
+
+# Process-wide cache: (kind, name) -> loaded model
+_models = {}
+_lock = threading.Lock()
+
+
+def _get_or_load(kind: str, name: str, loader):
+    """Return the cached model for (kind, name), loading it on first use."""
+    key = (kind, name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited
+        model = _models.get(key)
+        if model is None:
+            print(f"⏳ Loading {kind} model '{name}'...")
+            model = loader()
+            _models[key] = model
+            print(f"✅ {kind} model '{name}' ready")
+    return model
+
+
+def get_transcription_engine(engine: str = None, model_name: str = None, threads: int = 0):
+    """
+    Shared Whisper transcription engine, loaded lazily once per process.
+    `engine` is "whisper" (reference) or "faster-whisper" (CTranslate2 int8),
+    defaulting to TRANSCRIBE_ENGINE; see audio_processing/engines.py.
+    `threads` only applies when the engine is first loaded (0 = library default).
+    """
+    from audio_processing.engines import TRANSCRIBE_ENGINE, load_transcription_engine
+    engine = engine or TRANSCRIBE_ENGINE
+    model_name = model_name or WHISPER_MODEL_NAME
+    return _get_or_load(
+        "whisper", f"{model_name}@{engine}", lambda: load_transcription_engine(engine, model_name, threads)
+    )
+
+
+def get_embedding(model_name: str = None, backend: str = None):
+    """
+    Shared embedding function, loaded lazily once per process, on the backend
+    chosen by EMBEDDING_BACKEND (torch / onnx / onnx-int8, see embedding_backends.py).
+    Wrapped in the on-disk embedding cache unless EMBED_CACHE=0.
+    """
+    model_name = model_name or EMBEDDING_MODEL_NAME
+
+    def _load():
+        from embedding_backends import EMBEDDING_BACKEND, load_embedding_backend
+        embedding = load_embedding_backend(model_name, backend or EMBEDDING_BACKEND)
+        if USE_EMBED_CACHE:
+            from embedding_cache import CachedEmbeddings
+            # Vectors differ slightly between backends, so only fp32 torch shares the original namespace
+            namespace = model_name if embedding.name == "torch" else f"{model_name}@{embedding.name}"
+            embedding = CachedEmbeddings(embedding, namespace)
+        return embedding
+
+    return _get_or_load("embedding", f"{model_name}@{backend}" if backend else model_name, _load)
+
+
+def get_tokenizer(model_name: str = None):
+    """
+    Tokenizer of the embedding model (no weights), used to size chunks in
+    tokens the model will actually see.
+    """
+    model_name = model_name or EMBEDDING_MODEL_NAME
+
+    def _load():
+        from transformers import AutoTokenizer
+        # Short sentence-transformers names live under that org on the Hub
+        repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        return AutoTokenizer.from_pretrained(repo)
+
+    return _get_or_load("tokenizer", model_name, _load)
+
+
+def warmup(whisper: bool = True, embedding: bool = True) -> None:
+    """Load the default models up front so the first request doesn't pay for it."""
+    if embedding:
+        get_embedding()
+    if whisper:
+        get_transcription_engine()
+
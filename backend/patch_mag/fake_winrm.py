@@ -0,0 +1,119 @@
+"""
+Local stand-in for WinRM hosts, for exercising patch flows without real VMs.
+
+install_fake_connector() registers a "fake" transport with the session pool.
+Inventory entries with "transport": "fake" then get a FakeWinRMSession that
+answers Get-WindowsUpdate with a deterministic per-host update list and
+simulates scan / install / reboot latency.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from remote_pool import register_connector
+
+SCAN_SECONDS = float(os.environ.get("FAKE_WINRM_SCAN_SECONDS", "0.5"))
+INSTALL_SECONDS = float(os.environ.get("FAKE_WINRM_INSTALL_SECONDS", "1.0"))
+
+# Counters so tests can assert on what the fleet actually did
+stats = {"connects": 0, "scans": 0, "installs": 0, "max_rebooting": 0}
+# Hosts whose update scan fails, the way it does when PSWindowsUpdate is missing
+failing_scans = set()
+_rebooting = 0
+_stats_lock = threading.Lock()
+
+
+class FakeResponse:
+    """Same shape as winrm.Response."""
+
+    def __init__(self, std_out: str, std_err: str = "", status_code: int = 0):
+        self.std_out = std_out.encode("utf-8")
+        self.std_err = std_err.encode("utf-8")
+        self.status_code = status_code
+
+
+def fake_updates(host: str) -> list:
+    """Deterministic 0-4 updates per host, some needing a reboot."""
+    seed = int(hashlib.sha256(host.encode("utf-8")).hexdigest(), 16)
+    updates = []
+    for i in range(seed % 5):
+        kb = f"KB{5000000 + (seed >> (i * 8)) % 99999}"
+        updates.append({
+            "Title": f"Fake cumulative update {kb}",
+            "KB": kb,
+            "RebootRequired": bool((seed >> i) & 1),
+        })
+    return updates
+
+
+class FakeWinRMSession:
+    def __init__(self, host: str):
+        self.host = host
+
+    def _bump(self, key: str) -> None:
+        with _stats_lock:
+            stats[key] += 1
+
+    def run_ps(self, script: str) -> FakeResponse:
+        return self._run(script)
+
+    def run_cmd(self, command: str, args=()) -> FakeResponse:
+        return self._run(" ".join([command, *args]))
+
+    def stream_ps(self, script: str, on_output) -> FakeResponse:
+        """run_ps that reports progress lines while the command is still running."""
+        return self._run(script, on_output)
+
+    def _run(self, script: str, on_output=None) -> FakeResponse:
+        global _rebooting
+        progress = on_output or (lambda text: None)
+        if "Install-WindowsUpdate" in script:
+            self._bump("installs")
+            progress(f"Downloading updates on {self.host}...\n")
+            reboot = "-AutoReboot:$false" not in script
+            if reboot:
+                with _stats_lock:
+                    _rebooting += 1
+                    stats["max_rebooting"] = max(stats["max_rebooting"], _rebooting)
+            try:
+                time.sleep(INSTALL_SECONDS / 2)
+                progress(f"Installing updates on {self.host}...\n")
+                time.sleep(INSTALL_SECONDS / 2)
+            finally:
+                if reboot:
+                    with _stats_lock:
+                        _rebooting -= 1
+            progress(f"Installed updates on {self.host}\n")
+            return FakeResponse(f"Installed updates on {self.host}")
+
+        if "Get-WindowsUpdate" in script:
+            self._bump("scans")
+            time.sleep(SCAN_SECONDS)
+            if self.host in failing_scans:
+                return FakeResponse("", "Import-Module : The specified module 'PSWindowsUpdate' was not loaded", 1)
+            updates = fake_updates(self.host)
+            output = json.dumps(updates) if updates else ""
+            if output:
+                progress(output)
+            return FakeResponse(output)
+
+        return FakeResponse("", f"fake host cannot run: {script[:80]}", 1)
+
+
+def _connect(host, username, password, port=None):
+    with _stats_lock:
+        stats["connects"] += 1
+    return FakeWinRMSession(host)
+
+
+def install_fake_connector() -> None:
+    register_connector("fake", _connect)
+
+
+def fake_inventory(count: int) -> list:
+    """Inventory of `count` fake hosts in the same shape /patch/fleet accepts."""
+    return [
+        {"host": f"fake-{i:03d}", "username": "Administrator", "password": "fake", "os": "windows", "transport": "fake"}
+        for i in range(count)
+    ]
@@ -1,4 +1,14 @@
-from workflows.patch_flow import build_patch_graph
+import argparse
+import json
+import os
+import sys
+
+# Run from patch_mag/: make backend modules (remote_pool, ...) importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from patch_mag.workflows.patch_flow import build_patch_graph
+from patch_mag.workflows.fleet import run_fleet, FLEET_MAX_CONCURRENCY, FLEET_MAX_REBOOTING, FLEET_WAVE_SIZE
+from patch_mag.fake_winrm import fake_inventory, install_fake_connector, stats
 
 # VM Info (replace with your actual VM credentials)
 vm = {
@@ -8,11 +18,34 @@ vm = {
     "os": "windows"
 }
 
-# Build the flow and run it
-flow = build_patch_graph()
-flow.invoke({
-    "vm_info": vm,
-    "update_status": "",
-    "reboot_updates": [],
-    "no_reboot_updates": []
-})
\ No newline at end of file
+parser = argparse.ArgumentParser(description="Run the patch flow for one VM or a fleet")
+parser.add_argument("--fleet", help="JSON file with a list of VM dicts")
+parser.add_argument("--fake", type=int, default=0, help="patch N hosts on the local fake WinRM endpoint")
+parser.add_argument("--max-concurrency", type=int, default=FLEET_MAX_CONCURRENCY)
+parser.add_argument("--max-rebooting", type=int, default=FLEET_MAX_REBOOTING)
+parser.add_argument("--wave-size", type=int, default=FLEET_WAVE_SIZE)
+args = parser.parse_args()
+
+if args.fleet or args.fake:
+    if args.fake:
+        install_fake_connector()
+        inventory = fake_inventory(args.fake)
+    else:
+        with open(args.fleet, "r", encoding="utf-8") as f:
+            inventory = json.load(f)
+
+    for record in run_fleet(inventory, args.max_concurrency, args.max_rebooting, args.wave_size):
+        record.pop("log", None)
+        print(json.dumps(record))
+    if args.fake:
+        print(json.dumps({"fake_stats": stats}))
+else:
+    # Build the flow and run it
+    flow = build_patch_graph()
+    flow.invoke({
+        "vm_info": vm,
+        "update_status": "",
+        "reboot_updates": [],
+        "no_reboot_updates": [],
+        "log": []
+    })
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from patch_mag.workflows.patch_flow import build_patch_graph, run_config
+from transport_discovery import discover_transport
+
+FLEET_MAX_CONCURRENCY = int(os.environ.get("FLEET_MAX_CONCURRENCY", "10"))
+FLEET_MAX_REBOOTING = int(os.environ.get("FLEET_MAX_REBOOTING", "2"))
+FLEET_WAVE_SIZE = int(os.environ.get("FLEET_WAVE_SIZE", "0"))  # 0 = one rolling wave
+REBOOT_WAIT_TIMEOUT = float(os.environ.get("FLEET_REBOOT_WAIT_TIMEOUT", "900"))
+REBOOT_POLL_INTERVAL = float(os.environ.get("FLEET_REBOOT_POLL_INTERVAL", "15"))
+
+
+class RebootGate:
+    """
+    Caps how many hosts are rebooting at once. A slot is held from the start
+    of the reboot-required install until the host answers on WinRM again.
+    """
+
+    def __init__(self, max_rebooting: int = FLEET_MAX_REBOOTING, wait_timeout: float = REBOOT_WAIT_TIMEOUT):
+        self._slots = threading.BoundedSemaphore(max(1, max_rebooting))
+        self.wait_timeout = wait_timeout
+
+    @contextmanager
+    def rebooting(self, vm: dict):
+        with self._slots:
+            yield
+            self._wait_until_back(vm)
+
+    def _wait_until_back(self, vm: dict) -> None:
+        # Only real WinRM hosts are probed; other connectors (e.g. fake) return at once
+        if vm.get("transport", "winrm") != "winrm" or self.wait_timeout <= 0:
+            return
+        time.sleep(REBOOT_POLL_INTERVAL)  # give the box time to go down first
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            if discover_transport(vm["host"], use_cache=False) is not None:
+                return
+            time.sleep(REBOOT_POLL_INTERVAL)
+
+
+def _initial_state(vm: dict) -> dict:
+    return {
+        "vm_info": vm,
+        "update_status": "",
+        "reboot_updates": [],
+        "no_reboot_updates": [],
+        "log": ["🚀 Patch flow triggered."]
+    }
+
+
+def _patch_host(flow, vm: dict, wave: int, run_id: str) -> dict:
+    started = time.time()
+    # Keep the password in the run config so checkpoints never store it
+    state_vm = {k: v for k, v in vm.items() if k != "password"}
+    try:
+        result = flow.invoke(_initial_state(state_vm), run_config(run_id, vm["password"]))
+        status, log, error = result["update_status"], result["log"], None
+    except Exception as e:
+        status, log, error = "error", [], str(e)
+    return {
+        "host": vm["host"],
+        "run_id": run_id,
+        "wave": wave,
+        "status": status,
+        "reboot_updates": len(result["reboot_updates"]) if not error else 0,
+        "no_reboot_updates": len(result["no_reboot_updates"]) if not error else 0,
+        "seconds": round(time.time() - started, 2),
+        "log": log,
+        "error": error,
+    }
+
+
+def run_fleet(
+    inventory: list,
+    max_concurrency: int = FLEET_MAX_CONCURRENCY,
+    max_rebooting: int = FLEET_MAX_REBOOTING,
+    wave_size: int = FLEET_WAVE_SIZE,
+    checkpointer=None,
+):
+    """
+    Run the patch graph for every host in `inventory` and yield per-host
+    results as they finish, then a final {"summary": ...} record.
+
+    Args:
+        inventory (list): VM dicts (host, username, password, os[, transport])
+        max_concurrency (int): Hosts patched in parallel within a wave
+        max_rebooting (int): Hosts allowed to be rebooting at the same time
+        wave_size (int): Hosts per rolling wave; the next wave starts when the
+            previous one is done. 0 puts every host in a single wave.
+        checkpointer (optional): Persist each host's run as "<fleet_id>-<n>"
+            so it can be resumed through /patch
+    """
+    flow = build_patch_graph(reboot_gate=RebootGate(max_rebooting), checkpointer=checkpointer)
+    fleet_id = uuid.uuid4().hex
+    wave_size = wave_size if wave_size > 0 else max(1, len(inventory))
+    indexed = list(enumerate(inventory))
+    waves = [indexed[i : i + wave_size] for i in range(0, len(indexed), wave_size)]
+
+    started = time.time()
+    counts = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="fleet") as pool:
+        for wave_no, wave in enumerate(waves, start=1):
+            futures = [pool.submit(_patch_host, flow, vm, wave_no, f"{fleet_id}-{n}") for n, vm in wave]
+            for future in as_completed(futures):
+                record = future.result()
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+                yield record
+
+    yield {
+        "summary": {
+            "fleet_id": fleet_id,
+            "hosts": len(inventory),
+            "waves": len(waves),
+            "by_status": counts,
+            "seconds": round(time.time() - started, 2),
+        }
+    }
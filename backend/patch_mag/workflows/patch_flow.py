@@ -1,7 +1,23 @@
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
 from typing import TypedDict
-import winrm
 import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from remote_pool import get_session_pool, run_ps_streaming
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PATCH_CHECKPOINT_DB = os.environ.get(
+    "PATCH_CHECKPOINT_DB", os.path.join(script_dir, "..", "..", "uploads", "patch_checkpoints.sqlite")
+)
+
+# Windows Update scans take minutes; reuse a host's result for this long
+SCAN_CACHE_TTL = float(os.environ.get("PATCH_SCAN_CACHE_TTL", "1800"))
+_scan_cache = {}  # host -> (updates, expires_at)
+_scan_cache_lock = threading.Lock()
 
 class PatchAgentState(TypedDict):
     vm_info: dict
@@ -11,113 +27,298 @@ class PatchAgentState(TypedDict):
     log: list[str]  # log to return to frontend
 
 
-def check_updates(state: PatchAgentState) -> PatchAgentState:
-    vm = state["vm_info"]
-    state["log"].append(f" Checking for updates on {vm['host']}...")
+def _transport(vm: dict) -> str:
+    # "winrm" for real boxes; inventories may name another registered connector (e.g. "fake")
+    return vm.get("transport", "winrm")
+
+
+def _session(vm: dict, config: RunnableConfig = None):
+    """
+    Borrow a pooled WinRM session for the VM (one handshake per host, not per node).
+    The password may come from the run config instead of the state, so that
+    checkpointed state never stores it.
+    """
+    transport = _transport(vm)
+    port = vm.get("port", 5985 if transport == "winrm" else None)
+    secret = ((config or {}).get("configurable") or {}).get("password")
+    password = vm.get("password") or (secret.value if isinstance(secret, _Secret) else secret)
+    return get_session_pool().session(transport, vm["host"], vm["username"], password, port=port)
+
+
+def _emit(config: RunnableConfig, event: str, **data) -> None:
+    """Forward a progress event to the run's listener (see /patch/stream), if any."""
+    emit = ((config or {}).get("configurable") or {}).get("emit")
+    if emit is not None:
+        emit(event, data)
+
+
+def _output_listener(config: RunnableConfig, node: str):
+    """Callback streaming remote stdout as "output" events, or None when nobody listens."""
+    if ((config or {}).get("configurable") or {}).get("emit") is None:
+        return None
+    return lambda text: _emit(config, "output", node=node, text=text)
+
+
+def _log(state: PatchAgentState, config: RunnableConfig, line: str) -> None:
+    state["log"].append(line)
+    _emit(config, "log", line=line)
 
-    try:
-        session = winrm.Session(vm["host"], auth=(vm["username"], vm["password"]), transport='ntlm')
 
-        ps_script = """
+def _cached_scan(host: str):
+    with _scan_cache_lock:
+        hit = _scan_cache.get(host)
+    if hit and hit[1] > time.time():
+        return hit[0]
+    return None
+
+
+def _store_scan(host: str, updates: list) -> None:
+    with _scan_cache_lock:
+        _scan_cache[host] = (updates, time.time() + SCAN_CACHE_TTL)
+
+
+def _forget_installed(host: str, kbs: list) -> None:
+    """Drop installed KBs from the cached scan (or the whole entry once nothing is left)."""
+    with _scan_cache_lock:
+        hit = _scan_cache.get(host)
+        if not hit:
+            return
+        remaining = [u for u in hit[0] if u.get("KB") not in kbs]
+        if remaining:
+            _scan_cache[host] = (remaining, hit[1])
+        else:
+            _scan_cache.pop(host, None)
+
+
+def _kb_ids(updates: list) -> list:
+    """KB IDs from scan results, validated before they go into a remote script."""
+    kbs = []
+    for u in updates:
+        kb = str(u.get("KB") or "").strip()
+        if re.fullmatch(r"(KB)?\d+", kb, re.IGNORECASE):
+            kbs.append(kb.upper() if kb.upper().startswith("KB") else f"KB{kb}")
+    return kbs
+
+
+def _install_script(kbs: list, reboot: bool) -> str:
+    """One remote script installing exactly these KBs, without a fresh Get-WindowsUpdate scan."""
+    kb_list = ",".join(f"'{kb}'" for kb in kbs)
+    auto_reboot = "-AutoReboot" if reboot else "-AutoReboot:$false"
+    return f"""
         Import-Module PSWindowsUpdate
-        Get-WindowsUpdate -MicrosoftUpdate | Select Title, KB, RebootRequired | ConvertTo-Json
+        Install-WindowsUpdate -KBArticleID {kb_list} -MicrosoftUpdate -AcceptAll {auto_reboot} -Confirm:$false
         """
 
-        result = session.run_ps(ps_script)
-        output = result.std_out.decode().strip()
 
-        if not output:
-            state["log"].append("⚠️ No output from Get-WindowsUpdate.")
+def check_updates(state: PatchAgentState, config: RunnableConfig = None) -> PatchAgentState:
+    vm = state["vm_info"]
+    _log(state, config, f" Checking for updates on {vm['host']}...")
+
+    try:
+        updates = _cached_scan(vm["host"])
+        if updates is not None:
+            _log(state, config, " Using cached update scan.")
+        else:
+            ps_script = """
+            Import-Module PSWindowsUpdate
+            Get-WindowsUpdate -MicrosoftUpdate | Select Title, KB, RebootRequired | ConvertTo-Json
+            """
+
+            with _session(vm, config) as session:
+                result = run_ps_streaming(session, ps_script, _output_listener(config, "check_updates"))
+            output = result.std_out.decode().strip()
+            errors = result.std_err.decode(errors="replace").strip()
+            # A failed scan (module missing, access denied) prints nothing to stdout;
+            # it must not read as "up-to-date", let alone be cached as such
+            if result.status_code != 0 or (errors and not output):
+                raise RuntimeError(f"Get-WindowsUpdate failed (exit {result.status_code}): {errors or 'no error output'}")
+
+            updates = json.loads(output) if output else []
+            if isinstance(updates, dict):
+                updates = [updates]
+            _store_scan(vm["host"], updates)
+
+        if not updates:
+            _log(state, config, "⚠️ No output from Get-WindowsUpdate.")
             state["update_status"] = "up-to-date"
             return state
 
-        updates = json.loads(output)
-        if isinstance(updates, dict):
-            updates = [updates]
-
         reboot_required = [u for u in updates if u.get("RebootRequired")]
         no_reboot = [u for u in updates if not u.get("RebootRequired")]
 
-        state["log"].append(f" Found {len(updates)} updates.")
-        state["log"].append(f" Reboot-required updates: {len(reboot_required)}")
-        state["log"].append(f" No-reboot updates: {len(no_reboot)}")
+        _log(state, config, f" Found {len(updates)} updates.")
+        _log(state, config, f" Reboot-required updates: {len(reboot_required)}")
+        _log(state, config, f" No-reboot updates: {len(no_reboot)}")
 
         state["reboot_updates"] = reboot_required
         state["no_reboot_updates"] = no_reboot
         state["update_status"] = "updates found"
     except Exception as e:
-        state["log"].append(f"❌ Exception in check_updates: {e}")
+        _log(state, config, f"❌ Exception in check_updates: {e}")
         state["update_status"] = "error"
 
     return state
 
 
-def install_non_reboot_updates(state: PatchAgentState) -> PatchAgentState:
+def install_non_reboot_updates(state: PatchAgentState, config: RunnableConfig = None) -> PatchAgentState:
     if not state["no_reboot_updates"]:
-        state["log"].append("✅ No updates to install that don't require a reboot.")
+        _log(state, config, "✅ No updates to install that don't require a reboot.")
         return state
 
     vm = state["vm_info"]
-    state["log"].append(f"⬇ Installing non-reboot updates on {vm['host']}...")
+    _log(state, config, f"⬇ Installing non-reboot updates on {vm['host']}...")
 
     try:
-        session = winrm.Session(vm["host"], auth=(vm["username"], vm["password"]), transport='ntlm')
-        result = session.run_cmd("powershell.exe", [
-            "Get-WindowsUpdate | Where-Object {!$_.RebootRequired} | Install-WindowsUpdate -AcceptAll -AutoReboot:$false"
-        ])
-        state["log"].append("Install Output:\n" + result.std_out.decode().strip())
+        kbs = _kb_ids(state["no_reboot_updates"])
+        if not kbs:
+            _log(state, config, "⚠️ No valid KB IDs in non-reboot updates; skipping.")
+            return state
+        with _session(vm, config) as session:
+            result = run_ps_streaming(
+                session, _install_script(kbs, reboot=False), _output_listener(config, "install_non_reboot_updates")
+            )
+        if result.status_code == 0:
+            _forget_installed(vm["host"], kbs)
+        _log(state, config, "Install Output:\n" + result.std_out.decode().strip())
     except Exception as e:
-        state["log"].append(f"❌ Failed to install non-reboot updates: {e}")
+        _log(state, config, f"❌ Failed to install non-reboot updates: {e}")
     return state
 
 
-def prompt_user(state: PatchAgentState) -> PatchAgentState:
+def prompt_user(state: PatchAgentState, config: RunnableConfig = None) -> PatchAgentState:
     if not state["reboot_updates"]:
-        state["log"].append("✅ No reboot-required updates.")
+        _log(state, config, "✅ No reboot-required updates.")
         return state
 
     # Simulate acceptance (no real user prompt in backend)
-    state["log"].append("⚠️ Some updates require reboot. Proceeding with reboot-required updates...")
+    _log(state, config, "⚠️ Some updates require reboot. Proceeding with reboot-required updates...")
     state["update_status"] = "user_accepted"
     return state
 
 
-def install_reboot_updates(state: PatchAgentState) -> PatchAgentState:
+def install_reboot_updates(state: PatchAgentState, config: RunnableConfig = None) -> PatchAgentState:
     if state["update_status"] == "user_declined":
-        state["log"].append(" User declined reboot-required updates.")
+        _log(state, config, " User declined reboot-required updates.")
         return state
 
     if not state["reboot_updates"]:
-        state["log"].append("✅ No reboot-required updates to install.")
+        _log(state, config, "✅ No reboot-required updates to install.")
         return state
 
     vm = state["vm_info"]
-    state["log"].append(f"⬇ Installing reboot-required updates on {vm['host']}...")
+    _log(state, config, f"⬇ Installing reboot-required updates on {vm['host']}...")
 
     try:
-        session = winrm.Session(vm["host"], auth=(vm["username"], vm["password"]), transport='ntlm')
-        result = session.run_cmd("powershell.exe", [
-            "Get-WindowsUpdate | Where-Object {$_.RebootRequired} | Install-WindowsUpdate -AcceptAll -AutoReboot"
-        ])
-        state["log"].append(" Reboot Update Output:\n" + result.std_out.decode().strip())
+        kbs = _kb_ids(state["reboot_updates"])
+        if not kbs:
+            _log(state, config, "⚠️ No valid KB IDs in reboot-required updates; skipping.")
+            return state
+        with _session(vm, config) as session:
+            result = run_ps_streaming(
+                session, _install_script(kbs, reboot=True), _output_listener(config, "install_reboot_updates")
+            )
+        if result.status_code == 0:
+            _forget_installed(vm["host"], kbs)
+        # The box reboots now; don't hand its old connections to the next caller
+        get_session_pool().invalidate(_transport(vm), vm["host"])
+        _log(state, config, " Reboot Update Output:\n" + result.std_out.decode().strip())
         state["update_status"] = "all updates installed"
     except Exception as e:
-        state["log"].append(f"❌ Failed to install reboot-required updates: {e}")
+        _log(state, config, f"❌ Failed to install reboot-required updates: {e}")
 
     return state
 
 
-def build_patch_graph():
+def _traced(name: str, node):
+    """Emit node start/end events around a node so listeners can follow the flow."""
+    def traced_node(state: PatchAgentState, config: RunnableConfig = None) -> PatchAgentState:
+        _emit(config, "node", node=name, phase="start")
+        started = time.time()
+        state = node(state, config)
+        _emit(config, "node", node=name, phase="end", seconds=round(time.time() - started, 2))
+        return state
+    return traced_node
+
+
+def _gated(node, reboot_gate):
+    """Run a reboot-install node only while holding a slot in the fleet's reboot gate."""
+    def gated_node(state: PatchAgentState, config: RunnableConfig = None) -> PatchAgentState:
+        if not state["reboot_updates"] or state["update_status"] == "user_declined":
+            return node(state, config)
+        with reboot_gate.rebooting(state["vm_info"]):
+            return node(state, config)
+    return gated_node
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """
+    Shared SQLite checkpointer: every completed node is persisted under the
+    run's thread_id, so a flow interrupted by a crash or reboot resumes at the
+    next node instead of rescanning from check_updates.
+    """
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+            path = os.path.abspath(PATCH_CHECKPOINT_DB)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            _checkpointer = SqliteSaver(conn)
+        return _checkpointer
+
+
+class _Secret:
+    """
+    Wraps the password in the run config. Checkpointers copy plain str/int
+    configurable values into saved metadata; an opaque object is skipped.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def __repr__(self) -> str:
+        return "<secret>"
+
+
+def run_config(run_id: str, password: str = None, emit=None) -> dict:
+    """
+    Graph config for a checkpointed run; the password stays out of saved state and metadata.
+    emit(event, data), if given, receives node / log / output events as the run progresses.
+    """
+    configurable = {"thread_id": run_id}
+    if password:
+        configurable["password"] = _Secret(password)
+    if emit is not None:
+        configurable["emit"] = emit
+    return {"configurable": configurable}
+
+
+def build_patch_graph(reboot_gate=None, checkpointer=None):
+    """
+    Args:
+        reboot_gate (optional): Fleet-wide limiter whose rebooting(vm) context
+            is held while reboot-required updates install and the host restarts
+        checkpointer (optional): LangGraph checkpointer (see get_checkpointer);
+            runs must then be invoked with run_config(run_id, ...)
+    """
     graph = StateGraph(PatchAgentState)
 
-    graph.add_node("check_updates", check_updates)
-    graph.add_node("install_non_reboot_updates", install_non_reboot_updates)
-    graph.add_node("prompt_user", prompt_user)
-    graph.add_node("install_reboot_updates", install_reboot_updates)
+    reboot_node = _gated(install_reboot_updates, reboot_gate) if reboot_gate else install_reboot_updates
+
+    graph.add_node("check_updates", _traced("check_updates", check_updates))
+    graph.add_node("install_non_reboot_updates", _traced("install_non_reboot_updates", install_non_reboot_updates))
+    graph.add_node("prompt_user", _traced("prompt_user", prompt_user))
+    graph.add_node("install_reboot_updates", _traced("install_reboot_updates", reboot_node))
 
     graph.set_entry_point("check_updates")
     graph.add_edge("check_updates", "install_non_reboot_updates")
     graph.add_edge("install_non_reboot_updates", "prompt_user")
     graph.add_edge("prompt_user", "install_reboot_updates")
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
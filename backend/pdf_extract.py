@@ -0,0 +1,72 @@
+#Text extraction for ingestion: PDF pages across a process pool, big .txt files in blocks.
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "16"))
+TEXT_BLOCK_CHARS = int(os.environ.get("TEXT_BLOCK_CHARS", str(1 << 20)))
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Spawned so workers only import this light module, not Chroma or the models
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def page_count(file_path: str) -> int:
+    from PyPDF2 import PdfReader
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pages(file_path: str, first: int, last: int) -> list:
+    """[(page_number, text)] for pages first..last-1 (0-based range, 1-based numbers)."""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    return [(i + 1, reader.pages[i].extract_text() or "") for i in range(first, last)]
+
+
+def iter_pdf_pages(file_path: str, workers: int = PDF_WORKERS, pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Yield (page_number, text) in page order while later pages are still
+    being extracted. At most 2 * workers page ranges are in flight, so
+    memory stays flat however long the PDF is.
+    """
+    total = page_count(file_path)
+    ranges = [(i, min(i + pages_per_task, total)) for i in range(0, total, pages_per_task)]
+
+    if workers <= 1 or len(ranges) <= 1:
+        for first, last in ranges:
+            yield from extract_pages(file_path, first, last)
+        return
+
+    pool = _get_pool(workers)
+    pending = deque()
+    for first, last in ranges:
+        pending.append(pool.submit(extract_pages, file_path, first, last))
+        if len(pending) >= workers * 2:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def iter_text_blocks(file_path: str, block_chars: int = TEXT_BLOCK_CHARS):
+    """Yield a text file in blocks of about block_chars characters."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                break
+            yield block
@@ -0,0 +1,355 @@
+import base64
+import hashlib
+import os
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_PER_HOST = int(os.environ.get("REMOTE_POOL_MAX_PER_HOST", "4"))
+IDLE_TIMEOUT = float(os.environ.get("REMOTE_POOL_IDLE_TIMEOUT", "300"))
+ACQUIRE_TIMEOUT = float(os.environ.get("REMOTE_POOL_ACQUIRE_TIMEOUT", "60"))
+SSH_KEEPALIVE = int(os.environ.get("REMOTE_POOL_SSH_KEEPALIVE", "30"))
+# Sessions older than this are reconnected instead of reused (NTLM contexts and server-side quotas age out)
+MAX_SESSION_AGE = float(os.environ.get("REMOTE_POOL_MAX_SESSION_AGE", "1800"))
+# Sessions released less than this many seconds ago are reused without a health probe
+PROBE_AFTER_IDLE = float(os.environ.get("REMOTE_POOL_PROBE_AFTER_IDLE", "15"))
+# WinRM over HTTPS (port 5986): "validate" checks the host certificate against the
+# system CA bundle (REQUESTS_CA_BUNDLE for a private CA); "ignore" accepts any
+# certificate and is meant for lab hosts with self-signed ones. HTTP (5985) is unaffected.
+WINRM_CERT_VALIDATION = os.environ.get("WINRM_CERT_VALIDATION", "validate")
+
+
+class CertificateValidationError(ConnectionError):
+    """The host answered, but its TLS certificate failed validation (see WINRM_CERT_VALIDATION)."""
+
+
+def _is_certificate_error(exc) -> bool:
+    """True if `exc` wraps a certificate verification failure (requests/urllib3 nest it a few levels down)."""
+    seen = set()
+    pending = [exc]
+    while pending:
+        e = pending.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, ssl.SSLCertVerificationError):
+            return True
+        pending.extend([e.__cause__, e.__context__, getattr(e, "reason", None)])
+        pending.extend(a for a in e.args if isinstance(a, BaseException))
+    return False
+
+
+# -------------------- Connectors --------------------
+def _connect_winrm(host, username, password, port=None):
+    import winrm
+    port = port or 5985
+    scheme = "https" if port == 5986 else "http"
+    return winrm.Session(
+        f"{scheme}://{host}:{port}/wsman",
+        auth=(username, password),
+        transport="ntlm",
+        server_cert_validation=WINRM_CERT_VALIDATION,
+    )
+
+
+def _winrm_alive(session) -> bool:
+    # Opening and closing a shell is the cheapest authenticated round trip WinRM
+    # offers; it fails fast when the host rebooted or dropped the NTLM context.
+    protocol = getattr(session, "protocol", None)
+    if protocol is None:
+        return True
+    try:
+        protocol.close_shell(protocol.open_shell())
+        return True
+    except Exception:
+        return False
+
+
+def _close_winrm(session) -> None:
+    transport = getattr(getattr(session, "protocol", None), "transport", None)
+    if transport is not None and hasattr(transport, "close_session"):
+        transport.close_session()
+
+
+def _connect_ssh(host, username, password, port=None):
+    import paramiko
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(hostname=host, port=port or 22, username=username, password=password, timeout=10)
+    ssh.get_transport().set_keepalive(SSH_KEEPALIVE)
+    return ssh
+
+
+def _ssh_alive(ssh) -> bool:
+    transport = ssh.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+    try:
+        transport.send_ignore()
+        return True
+    except Exception:
+        return False
+
+
+def _close_ssh(ssh) -> None:
+    ssh.close()
+
+
+# transport name -> (connect, is_alive, close)
+_CONNECTORS = {
+    "winrm": (_connect_winrm, _winrm_alive, _close_winrm),
+    "ssh": (_connect_ssh, _ssh_alive, _close_ssh),
+}
+
+
+def register_connector(transport: str, connect, is_alive=None, close=None) -> None:
+    """Add or override how sessions for a transport are opened, checked and closed."""
+    _CONNECTORS[transport] = (connect, is_alive or (lambda client: True), close or (lambda client: None))
+
+
+# -------------------- Streaming execution --------------------
+def run_ps_streaming(session, script: str, on_output=None):
+    """
+    Like session.run_ps, but calls on_output(text) with stdout as the remote
+    command produces it instead of only after it exits.
+    Sessions that know how to stream themselves (e.g. the fake WinRM host)
+    provide stream_ps; anything else falls back to run_ps.
+    """
+    if on_output is None:
+        return session.run_ps(script)
+    if hasattr(session, "stream_ps"):
+        return session.stream_ps(script, on_output)
+    if not hasattr(session, "protocol"):
+        return session.run_ps(script)
+
+    import winrm
+    from winrm.exceptions import WinRMOperationTimeoutError
+
+    encoded = base64.b64encode(script.encode("utf_16_le")).decode("ascii")
+    protocol = session.protocol
+    shell_id = protocol.open_shell()
+    try:
+        command_id = protocol.run_command(shell_id, "powershell -encodedcommand {0}".format(encoded))
+        stdout, stderr, code, done = [], [], 0, False
+        try:
+            while not done:
+                try:
+                    out, err, code, done = protocol._raw_get_command_output(shell_id, command_id)
+                except WinRMOperationTimeoutError:
+                    continue  # no output within the operation timeout; keep polling
+                if out:
+                    stdout.append(out)
+                    on_output(out.decode(errors="ignore"))
+                if err:
+                    stderr.append(err)
+        finally:
+            protocol.cleanup_command(shell_id, command_id)
+    finally:
+        protocol.close_shell(shell_id)
+
+    result = winrm.Response((b"".join(stdout), b"".join(stderr), code))
+    if result.std_err:
+        result.std_err = session._clean_error_msg(result.std_err)
+    return result
+
+
+# -------------------- Pool --------------------
+class _Entry:
+    __slots__ = ("client", "key", "epoch", "created", "last_used")
+
+    def __init__(self, client, key, epoch):
+        self.client = client
+        self.key = key
+        self.epoch = epoch  # host's invalidation count when the session was opened
+        self.created = self.last_used = time.time()
+
+
+class SessionPool:
+    """
+    Reusable WinRM / SSH sessions keyed by (transport, host, port, user, password hash).
+
+    Idle sessions are health-checked before reuse (unless released only
+    moments ago), reconnected once older than `max_age` and closed after
+    `idle_timeout`. At most `max_per_host` sessions exist per key; extra
+    callers wait for one to be released. A session that raises while in use,
+    or whose host was invalidated meanwhile, is discarded rather than
+    returned to the pool.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = MAX_PER_HOST,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_age: float = MAX_SESSION_AGE,
+    ):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self._idle = {}    # key -> [_Entry]
+        self._counts = {}  # key -> sessions open (idle + in use)
+        self._epochs = {}  # (transport, host) -> invalidate() calls so far
+        self._cond = threading.Condition()
+        self._reaper = None
+
+    @staticmethod
+    def _key(transport, host, username, password, port):
+        secret = hashlib.sha256((password or "").encode("utf-8")).hexdigest()
+        return (transport, host, port, username, secret)
+
+    def _acquire(self, key, connect_args):
+        connect, is_alive, close = _CONNECTORS[key[0]]
+        deadline = time.time() + ACQUIRE_TIMEOUT
+        while True:
+            with self._cond:
+                entry = self._reserve(key, deadline)
+                epoch = self._epochs.get(key[:2], 0)
+            if entry is None:
+                break
+            # Probe outside the lock: for WinRM it is a network round trip
+            if self._usable(entry, is_alive):
+                return entry
+            with self._cond:
+                self._discard(entry, close)
+
+        # Handshake outside the lock so other hosts aren't blocked
+        try:
+            return _Entry(connect(*connect_args), key, epoch)
+        except Exception:
+            with self._cond:
+                self._counts[key] -= 1
+                self._cond.notify()
+            raise
+
+    def _reserve(self, key, deadline):
+        """
+        An idle session to reuse, or None once a slot for a new one is
+        reserved; waits while the key is at max_per_host. Caller holds the lock.
+        """
+        while True:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            if self._counts.get(key, 0) < self.max_per_host:
+                self._counts[key] = self._counts.get(key, 0) + 1
+                return None
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"No free {key[0]} session for {key[1]} after {ACQUIRE_TIMEOUT:.0f}s")
+            self._cond.wait(remaining)
+
+    def _usable(self, entry, is_alive) -> bool:
+        now = time.time()
+        if now - entry.created > self.max_age:
+            return False
+        if now - entry.last_used < PROBE_AFTER_IDLE:
+            return True
+        try:
+            return is_alive(entry.client)
+        except Exception:
+            return False
+
+    def _release(self, entry) -> None:
+        entry.last_used = time.time()
+        with self._cond:
+            if entry.epoch != self._epochs.get(entry.key[:2], 0):
+                self._discard(entry)  # host invalidated while this session was in use
+                return
+            self._idle.setdefault(entry.key, []).append(entry)
+            self._cond.notify()
+            self._ensure_reaper()
+
+    def _discard(self, entry, close=None) -> None:
+        """Close a session and free its slot. Caller holds the lock."""
+        close = close or _CONNECTORS[entry.key[0]][2]
+        try:
+            close(entry.client)
+        except Exception:
+            pass
+        self._counts[entry.key] -= 1
+        self._cond.notify()
+
+    @contextmanager
+    def session(self, transport: str, host: str, username: str, password: str, port: int = None):
+        """
+        Borrow a warm session; it goes back to the pool when the block exits cleanly.
+        A failure caused by the host's TLS certificate is raised as CertificateValidationError.
+        """
+        key = self._key(transport, host, username, password, port)
+        entry = self._acquire(key, (host, username, password, port))
+        try:
+            yield entry.client
+        except Exception as e:
+            with self._cond:
+                self._discard(entry)
+            if _is_certificate_error(e):
+                raise CertificateValidationError(
+                    f"TLS certificate of {host}:{port} failed validation ({e}); trust its CA, "
+                    "or set WINRM_CERT_VALIDATION=ignore for a lab host"
+                ) from e
+            raise
+        else:
+            self._release(entry)
+
+    def evict_idle(self) -> int:
+        """Close sessions idle for longer than idle_timeout."""
+        cutoff = time.time() - self.idle_timeout
+        evicted = 0
+        with self._cond:
+            for key, entries in list(self._idle.items()):
+                keep = []
+                for entry in entries:
+                    if entry.last_used < cutoff:
+                        self._discard(entry)
+                        evicted += 1
+                    else:
+                        keep.append(entry)
+                self._idle[key] = keep
+        return evicted
+
+    def invalidate(self, transport: str, host: str) -> None:
+        """
+        Drop every idle session to a host (e.g. after it rebooted). Sessions
+        in use right now are marked stale and closed when released.
+        """
+        with self._cond:
+            self._epochs[(transport, host)] = self._epochs.get((transport, host), 0) + 1
+            for key, entries in list(self._idle.items()):
+                if key[0] == transport and key[1] == host:
+                    for entry in entries:
+                        self._discard(entry)
+                    self._idle[key] = []
+
+    def close_all(self) -> None:
+        with self._cond:
+            for entries in self._idle.values():
+                for entry in entries:
+                    self._discard(entry)
+            self._idle.clear()
+
+    def _ensure_reaper(self) -> None:
+        """Start the idle-eviction thread once. Caller holds the lock."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+
+        def _reap():
+            while True:
+                time.sleep(max(5.0, self.idle_timeout / 4))
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=_reap, name="session-pool-reaper", daemon=True)
+        self._reaper.start()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """Process-wide session pool shared by voice commands and patch flows."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SessionPool()
+    return _pool
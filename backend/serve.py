@@ -0,0 +1,41 @@
+"""
+Production server: asgi.py under uvicorn with SERVE_WORKERS worker processes.
+
+    python serve.py
+
+app.py (Flask, debug reloader) remains the development server. This
+process only supervises: it runs the ingest workers once for all web
+workers and restarts web workers that die. SIGINT/SIGTERM stop new
+connections, let in-flight requests finish for up to
+SERVE_GRACEFUL_TIMEOUT seconds, then stop the ingest workers.
+"""
+import os
+import uvicorn
+from jobs import start_workers
+
+SERVE_HOST = os.environ.get("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", "5000"))
+# One process already serves requests concurrently (async + thread pools); raise it on many-core hosts
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "1"))
+SERVE_GRACEFUL_TIMEOUT = int(os.environ.get("SERVE_GRACEFUL_TIMEOUT", "30"))
+SERVE_BACKLOG = int(os.environ.get("SERVE_BACKLOG", "2048"))
+
+
+def main():
+    # Web workers inherit this and leave the ingest queue to the workers started here
+    os.environ["INGEST_IN_SUPERVISOR"] = "1"
+    start_workers()
+    print(f"🚀 Serving on {SERVE_HOST}:{SERVE_PORT} with {SERVE_WORKERS} workers")
+    uvicorn.run(
+        "asgi:app",
+        host=SERVE_HOST,
+        port=SERVE_PORT,
+        workers=SERVE_WORKERS,
+        backlog=SERVE_BACKLOG,
+        timeout_graceful_shutdown=SERVE_GRACEFUL_TIMEOUT,
+        lifespan="on",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""
+Tests import backend modules by name (as the servers do) and keep every
+on-disk store in a throwaway directory, so they never touch chroma_db/ or
+uploads/. Spawned worker processes inherit both through sys.path and the
+environment.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_data_dir = tempfile.mkdtemp(prefix="backend-tests-")
+for var, name in (
+    ("STORE_META_PATH", "store_meta.sqlite"),
+    ("LEXICAL_INDEX_PATH", "lexical_index.sqlite"),
+    ("EMBED_CACHE_PATH", "embedding_cache.sqlite"),
+    ("JOBS_DB_PATH", "jobs.sqlite"),
+):
+    os.environ[var] = os.path.join(_data_dir, name)
@@ -0,0 +1,15 @@
+"""
+Tests for the semantic answer cache.
+"""
+from agent.answer_cache import AnswerCache
+
+
+def test_semantic_hit_requires_the_same_identifiers():
+    cache = AnswerCache(threshold=0.9)
+    vector = [1.0, 0.0, 0.0]
+    cache.put("Why did KB5034441 fail to install?", "scope", 1, {"answer": "cached"}, vector)
+
+    assert cache.get_similar("why did kb5034441 fail installing", vector, "scope", 1) == {"answer": "cached"}
+    assert cache.get_similar("Why did KB5034440 fail to install?", vector, "scope", 1) is None
+    assert cache.get_similar("Why did KB5034441 fail with 0x80070005?", vector, "scope", 1) is None
+    assert cache.get_similar("Why did KB5034441 fail to install?", vector, "other scope", 1) is None
@@ -0,0 +1,34 @@
+"""
+Tests for the request parsing shared by app.py and asgi.py.
+"""
+import pytest
+
+from api_helpers import ASK_BATCH_CONCURRENCY, parse_ask_batch, parse_fleet
+
+
+def test_ask_batch_limits_concurrency_to_the_server_cap():
+    queries, _, _, max_concurrency = parse_ask_batch({"queries": [" a ", "b"], "max_concurrency": 2})
+    assert queries == ["a", "b"] and max_concurrency == min(2, ASK_BATCH_CONCURRENCY)
+    assert parse_ask_batch({"queries": ["a"]})[3] == ASK_BATCH_CONCURRENCY
+    assert parse_ask_batch({"queries": ["a"], "max_concurrency": "10000"})[3] == ASK_BATCH_CONCURRENCY
+
+
+@pytest.mark.parametrize("value, message", [
+    ([4], "max_concurrency must be an integer"),
+    ({"n": 4}, "max_concurrency must be an integer"),
+    ("lots", "max_concurrency must be an integer"),
+    (True, "max_concurrency must be an integer"),
+    (0, "max_concurrency must be at least 1"),
+])
+def test_ask_batch_rejects_bad_concurrency_like_fleet(value, message):
+    with pytest.raises(ValueError, match=message):
+        parse_ask_batch({"queries": ["a"], "max_concurrency": value})
+    fleet = {"hosts": [{"host": "h"}], "username": "u", "password": "p", "max_concurrency": value}
+    with pytest.raises(ValueError, match=message):
+        parse_fleet(fleet)
+
+
+@pytest.mark.parametrize("queries", [["a", 3], ["a", None], ["a", ["b"]], ["a", {"q": "b"}]])
+def test_ask_batch_rejects_non_string_queries(queries):
+    with pytest.raises(ValueError, match="queries must be a list of strings"):
+        parse_ask_batch({"queries": queries})
@@ -0,0 +1,49 @@
+"""
+Tests for the sentence-aware, token-budgeted chunker, sized with a one-token-per-word
+fake tokenizer so no model download is needed.
+"""
+import re
+
+from chunking import chunk_segments, chunk_text
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word; covers the calls chunking makes."""
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        spans = [m.span() for m in re.finditer(r"\S+", text)]
+        encoded = {"input_ids": list(range(len(spans)))}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = spans
+        return encoded
+
+
+def test_chunk_text_packs_whole_sentences_with_overlap():
+    sentences = [f"s{i} alpha beta gamma delta." for i in range(10)]  # 5 tokens each
+    # 22 - 2 special tokens = 20: four sentences per chunk, the last one carried over
+    chunks = list(chunk_text(" ".join(sentences), max_tokens=22, overlap_tokens=5, tokenizer=WordTokenizer()))
+    assert chunks == [
+        " ".join(sentences[0:4]),
+        " ".join(sentences[3:7]),
+        " ".join(sentences[6:10]),
+    ]
+
+
+def test_chunk_text_without_overlap_repeats_nothing():
+    sentences = [f"s{i} alpha beta gamma delta." for i in range(8)]
+    chunks = list(chunk_text(" ".join(sentences), max_tokens=22, overlap_tokens=0, tokenizer=WordTokenizer()))
+    assert chunks == [" ".join(sentences[0:4]), " ".join(sentences[4:8])]
+
+
+def test_chunk_text_cuts_only_sentences_over_the_budget():
+    long_sentence = " ".join(f"w{i}" for i in range(45)) + "."
+    chunks = list(chunk_text(f"Short one. {long_sentence}", max_tokens=22, overlap_tokens=0, tokenizer=WordTokenizer()))
+    tokenizer = WordTokenizer()
+    assert all(len(tokenizer(c)["input_ids"]) <= 20 for c in chunks)
+    assert " ".join(chunks).split() == f"Short one. {long_sentence}".split()
+
+
+def test_chunk_segments_keeps_segment_times():
+    segments = [{"start": i * 2.0, "end": i * 2.0 + 1.5, "text": f"seg{i} a b c d"} for i in range(6)]
+    chunks = list(chunk_segments(segments, max_tokens=12, tokenizer=WordTokenizer()))
+    assert [(c["start"], c["end"]) for c in chunks] == [(0.0, 3.5), (4.0, 7.5), (8.0, 11.5)]
@@ -0,0 +1,42 @@
+"""
+Tests for the fleet reboot gate, directly and through run_fleet on the fake WinRM connector.
+"""
+import threading
+import time
+
+from patch_mag import fake_winrm
+from patch_mag.workflows.fleet import RebootGate, run_fleet
+
+
+def test_reboot_gate_caps_hosts_rebooting_at_once():
+    gate = RebootGate(max_rebooting=2, wait_timeout=0)
+    inside, peak = [0], [0]
+    lock = threading.Lock()
+
+    def reboot(n):
+        with gate.rebooting({"host": f"h{n}", "transport": "fake"}):
+            with lock:
+                inside[0] += 1
+                peak[0] = max(peak[0], inside[0])
+            time.sleep(0.02)
+            with lock:
+                inside[0] -= 1
+
+    threads = [threading.Thread(target=reboot, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+
+
+def test_fleet_never_reboots_more_hosts_than_allowed(monkeypatch):
+    monkeypatch.setattr(fake_winrm, "SCAN_SECONDS", 0.0)
+    monkeypatch.setattr(fake_winrm, "INSTALL_SECONDS", 0.05)
+    monkeypatch.setitem(fake_winrm.stats, "max_rebooting", 0)
+    fake_winrm.install_fake_connector()
+
+    records = list(run_fleet(fake_winrm.fake_inventory(12), max_concurrency=12, max_rebooting=1))
+    summary = records[-1]["summary"]
+    assert summary["hosts"] == 12 and "error" not in summary["by_status"]
+    assert fake_winrm.stats["max_rebooting"] == 1
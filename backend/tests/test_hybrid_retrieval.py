@@ -0,0 +1,50 @@
+"""
+Tests for hybrid retrieval: the contentless BM25 index and reciprocal rank fusion.
+"""
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex
+from vectorstore import reciprocal_rank_fusion
+
+
+# -------------------- lexical index --------------------
+def test_lexical_index_keeps_postings_and_filter_fields_only(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    texts = {"a" * 64: "KB5034441 failed with 0x80070005", "b" * 64: "KB5034441 installed fine", "c" * 64: "VPN reset"}
+    sources = {"a" * 64: "s1", "b" * 64: "s2", "c" * 64: "s1"}
+    docs = [Document(page_content=t, metadata={"source_id": sources[cid], "page": 3}) for cid, t in texts.items()]
+    index.add(list(texts), docs)
+    index.add(list(texts), docs)  # re-adding the same chunks is a no-op
+
+    assert index.count() == 3
+    assert index.search("0x80070005") == ["a" * 64]
+    assert set(index.search("kb5034441")) == {"a" * 64, "b" * 64}
+    assert index.search("kb5034441", filters={"source_id": ["s2"]}) == ["b" * 64]
+    columns = [row[1] for row in index._connect().execute("PRAGMA table_info(chunk_keys)")]
+    assert "text" not in columns and "page" not in columns
+
+    index.delete(["a" * 64], [texts["a" * 64]])
+    assert index.search("0x80070005") == [] and index.search("kb5034441") == ["b" * 64]
+    vocab = dict(index._connect().execute("SELECT term, doc FROM chunk_terms_vocab").fetchall())
+    assert "0x80070005" not in vocab and vocab["kb5034441"] == 1  # postings removed, not just hidden
+    index.add(["a" * 64], [docs[0]])
+    assert index.search("0x80070005") == ["a" * 64]
+    index.clear()
+    assert index.is_empty() and index.search("vpn") == []
+
+
+# -------------------- rank fusion --------------------
+def _ranking(*ids):
+    return [(cid, Document(page_content=cid)) for cid in ids]
+
+
+def test_rrf_prefers_chunks_found_by_both_rankings():
+    dense = _ranking("a", "b", "c")
+    lexical = _ranking("d", "c", "e")
+    fused = reciprocal_rank_fusion([dense, lexical], k=3)
+    assert [d.page_content for d in fused] == ["c", "a", "d"]
+
+
+def test_rrf_limits_to_k_and_handles_empty_rankings():
+    assert [d.page_content for d in reciprocal_rank_fusion([_ranking("x", "y"), []], k=1)] == ["x"]
+    assert reciprocal_rank_fusion([[], []], k=4) == []
@@ -0,0 +1,72 @@
+"""
+Tests for the SQLite ingest job queue and its worker.
+"""
+import multiprocessing
+import threading
+import time
+
+import ingest
+import jobs
+from jobs import JobQueue
+
+
+def _exited_pid() -> int:
+    process = multiprocessing.get_context("spawn").Process(target=time.sleep, args=(0,))
+    process.start()
+    process.join()
+    return process.pid
+
+
+def test_claim_takes_oldest_job_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    first = queue.enqueue("ingest", {"file_path": "a.txt"})
+    second = queue.enqueue("ingest", {"file_path": "b.txt"})
+
+    claimed = []
+    threads = [threading.Thread(target=lambda: claimed.append(queue.claim(1234))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    taken = [job for job in claimed if job is not None]
+    assert sorted(job["id"] for job in taken) == sorted([first, second])
+    assert queue.get(first)["status"] == "running" and queue.get(first)["worker_pid"] == 1234
+    assert queue.claim(1234) is None
+
+
+def test_requeue_orphans_only_requeues_dead_workers(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    orphan = queue.enqueue("ingest", {"file_path": "a.txt"})
+    live = queue.enqueue("ingest", {"file_path": "b.txt"})
+    assert queue.claim(_exited_pid())["id"] == orphan
+    assert queue.claim(multiprocessing.current_process().pid)["id"] == live
+
+    assert queue.requeue_orphans() == 1
+    assert queue.get(orphan)["status"] == "queued" and queue.get(orphan)["worker_pid"] is None
+    assert queue.get(live)["status"] == "running"
+    assert queue.claim(99)["id"] == orphan
+
+
+def _run_one(queue: JobQueue, path: str) -> dict:
+    job_id = queue.enqueue("ingest", {"file_path": path, "filename": "notes.txt"})
+    jobs._run_job(queue, queue.claim(1234))
+    return queue.get(job_id)
+
+
+def test_finished_jobs_remove_their_upload(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    done, failed, kept = (tmp_path / name for name in ("done.txt", "failed.txt", "kept.txt"))
+    for path in (done, failed, kept):
+        path.write_text("hello")
+
+    monkeypatch.setattr(ingest, "ingest_file", lambda path, filename=None, report=None: {"chunks": 1})
+    assert _run_one(queue, str(done))["status"] == "done" and not done.exists()
+
+    def broken(path, filename=None, report=None):
+        raise RuntimeError("unreadable")
+    monkeypatch.setattr(ingest, "ingest_file", broken)
+    assert _run_one(queue, str(failed))["status"] == "failed" and not failed.exists()
+
+    monkeypatch.setattr(jobs, "INGEST_KEEP_UPLOADS", True)
+    assert _run_one(queue, str(kept))["status"] == "failed" and kept.exists()
@@ -0,0 +1,27 @@
+"""
+Tests for the update scan in the patch flow, run against the fake WinRM connector.
+"""
+from patch_mag import fake_winrm
+from patch_mag.workflows import patch_flow
+
+
+def _state(host: str) -> dict:
+    vm = fake_winrm.fake_inventory(1)[0] | {"host": host}
+    return {"vm_info": vm, "update_status": "", "reboot_updates": [], "no_reboot_updates": [], "log": []}
+
+
+def test_failed_scan_is_an_error_and_not_cached(monkeypatch):
+    monkeypatch.setattr(fake_winrm, "SCAN_SECONDS", 0.0)
+    monkeypatch.setattr(fake_winrm, "failing_scans", {"fake-broken"})
+    monkeypatch.setattr(patch_flow, "_scan_cache", {})
+    fake_winrm.install_fake_connector()
+
+    state = patch_flow.check_updates(_state("fake-broken"))
+    assert state["update_status"] == "error"
+    assert any("PSWindowsUpdate" in line for line in state["log"])
+    assert patch_flow._cached_scan("fake-broken") is None
+
+    fake_winrm.failing_scans.clear()
+    state = patch_flow.check_updates(_state("fake-broken"))  # the next run rescans
+    assert state["update_status"] == ("updates found" if fake_winrm.fake_updates("fake-broken") else "up-to-date")
+    assert patch_flow._cached_scan("fake-broken") == fake_winrm.fake_updates("fake-broken")
@@ -0,0 +1,32 @@
+"""
+Tests for the overlapping windows streamed transcription cuts audio into.
+"""
+import numpy as np
+import pytest
+
+from audio_processing.extract_audio import SAMPLE_RATE
+from audio_processing.stream_transcribe import iter_windows
+
+
+def test_iter_windows_assigns_every_instant_to_one_window():
+    seconds = 70.5
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    windows = list(iter_windows(np.array_split(audio, 7), window_s=30, overlap_s=4))
+
+    assert windows[0][2] == 0.0 and windows[-1][3] == float("inf")
+    for (_, _, _, keep_to), (_, _, keep_from, _) in zip(windows, windows[1:]):
+        assert keep_to == pytest.approx(keep_from)  # owned ranges neither gap nor overlap
+    for samples, offset, keep_from, keep_to in windows:
+        end = offset + len(samples) / SAMPLE_RATE
+        assert len(samples) <= 30 * SAMPLE_RATE
+        assert offset <= keep_from < min(keep_to, end)  # a window owns only audio it has
+    last_samples, last_offset = windows[-1][0], windows[-1][1]
+    assert last_offset + len(last_samples) / SAMPLE_RATE == pytest.approx(seconds)
+
+
+def test_iter_windows_short_audio_is_one_window():
+    audio = np.ones(5 * SAMPLE_RATE, dtype=np.float32)
+    windows = list(iter_windows([audio], window_s=30, overlap_s=4))
+    assert len(windows) == 1
+    samples, offset, keep_from, keep_to = windows[0]
+    assert len(samples) == len(audio) and (offset, keep_from, keep_to) == (0.0, 0.0, float("inf"))
@@ -0,0 +1,107 @@
+"""
+Token-streamed /ask answers, run on the fake LLM client and fake embeddings:
+sources go out before the first token, the tokens add up to the answer
+/ask would give, and cached answers stream too.
+"""
+import json
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import model_registry
+from agent import ask_question
+from agent.answer_cache import AnswerCache
+from agent.llm_client import FakeStreamingClient
+from vectorstore import VectorStoreService
+
+QUERY = "Why did KB5034441 fail to install?"
+
+
+class CountingClient(FakeStreamingClient):
+    def __init__(self):
+        super().__init__(token_delay=0)
+        self.calls = 0
+
+    def complete(self, prompt):
+        self.calls += 1
+        return super().complete(prompt)
+
+    def stream(self, prompt):
+        self.calls += 1
+        return super().stream(prompt)
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    """Fake model and embeddings, a throwaway store with two chunks, and an empty answer cache."""
+    monkeypatch.setitem(
+        model_registry._models, ("embedding", model_registry.EMBEDDING_MODEL_NAME), DeterministicFakeEmbedding(size=32)
+    )
+    store = VectorStoreService(str(tmp_path / "chroma"))
+    store.add_documents([
+        Document(page_content="KB5034441 fails with 0x80070643 when the recovery partition is too small.",
+                 metadata={"source_id": "kb"}),
+        Document(page_content="Resize the recovery partition, then retry the update.", metadata={"source_id": "kb"}),
+    ])
+    client = CountingClient()
+    monkeypatch.setattr(ask_question, "vectorstore", store)
+    monkeypatch.setattr(ask_question, "answer_cache", AnswerCache())
+    monkeypatch.setattr(ask_question, "get_llm_client", lambda: client)
+    yield client
+    store.reset()  # the lexical index lives outside tmp_path
+
+
+def _split(events):
+    kinds = [event for event, _ in events]
+    tokens = [payload for event, payload in events if event == "token"]
+    return kinds, tokens
+
+
+def test_fake_client_stream_joins_to_complete():
+    client = FakeStreamingClient(token_delay=0)
+    tokens = list(client.stream("Question:\nWhat is a KB?"))
+    assert len(tokens) > 1 and "".join(tokens) == client.complete("Question:\nWhat is a KB?")
+
+
+def test_sources_come_first_and_tokens_join_to_the_answer(llm, monkeypatch):
+    monkeypatch.setattr(ask_question, "ANSWER_CACHE_ENABLED", False)
+    events = list(ask_question.stream_response(QUERY))
+    kinds, tokens = _split(events)
+
+    assert kinds[0] == "sources" and kinds[-1] == "done"
+    assert set(kinds[1:-1]) == {"token"} and len(tokens) > 1
+    assert any("KB5034441" in s["text"] for s in events[0][1])
+
+    expected = ask_question.generate_response(QUERY)
+    assert "".join(tokens) == events[-1][1]["answer"] == expected["answer"]
+    assert events[0][1] == expected["sources"]
+
+
+def test_cache_hits_still_stream(llm):
+    first = list(ask_question.stream_response(QUERY))
+    assert llm.calls == 1
+
+    again = list(ask_question.stream_response(QUERY))
+    kinds, tokens = _split(again)
+    assert llm.calls == 1  # answered from the cache
+    assert kinds[0] == "sources" and kinds[-1] == "done" and tokens
+    assert again[0][1] == first[0][1]
+    assert "".join(tokens) == again[-1][1]["answer"] == first[-1][1]["answer"]
+    assert ask_question.generate_response(QUERY)["answer"] == first[-1][1]["answer"] and llm.calls == 1
+
+
+def test_ask_stream_route_sends_sources_then_tokens(llm):
+    pytest.importorskip("langchain.chains")  # app.py pulls in the voice-command chain
+    import app as flask_app
+
+    response = flask_app.app.test_client().post("/ask/stream", json={"query": QUERY})
+    assert response.status_code == 200 and response.mimetype == "text/event-stream"
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+
+    kinds = [event for event, _ in events]
+    assert kinds[0] == "sources" and kinds[-1] == "done" and set(kinds[1:-1]) == {"token"}
+    assert "".join(data["text"] for event, data in events if event == "token") == events[-1][1]["answer"]
@@ -0,0 +1,51 @@
+"""
+Tests for the on-disk Whisper transcript cache.
+"""
+import os
+import sqlite3
+
+from audio_processing.transcript_cache import TranscriptCache
+
+
+def _stored(cache: TranscriptCache):
+    conn = cache._connect()
+    stats = conn.execute("SELECT bytes, rows FROM cache_stats").fetchone()
+    actual = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0), COUNT(*) FROM transcripts").fetchone()
+    return stats, actual
+
+
+def _result(i: int) -> dict:
+    # Incompressible text, so each entry has a predictable size on disk
+    return {"text": os.urandom(2000).hex(), "segments": [{"start": float(i), "end": i + 1.0}]}
+
+
+def test_size_stats_stay_exact_and_eviction_drops_least_recent(tmp_path):
+    cache = TranscriptCache(str(tmp_path / "transcripts.sqlite"), max_bytes=1 << 30)
+    for i in range(5):
+        cache.put(f"k{i}", _result(i))
+    cache.put("k0", {"text": "short now"})  # overwriting adjusts the size instead of adding to it
+    stats, actual = _stored(cache)
+    assert stats == actual and actual[1] == 5
+
+    cache.get("k1")  # k1 becomes the most recently used
+    cache.max_bytes = actual[0] - 1
+    cache.put("k5", {"text": "tiny"})
+    stats, actual = _stored(cache)
+    assert stats == actual and actual[0] <= cache.max_bytes * 0.9
+    assert cache.get("k1") is not None and cache.get("k5") == {"text": "tiny"}
+    assert cache.get("k2") is None  # the least recently used large entry went first
+
+
+def test_stats_are_seeded_for_a_cache_created_before_them(tmp_path):
+    path = str(tmp_path / "transcripts.sqlite")
+    TranscriptCache(path).put("old", {"text": "from before"})
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "DROP TRIGGER transcripts_ai; DROP TRIGGER transcripts_ad; DROP TRIGGER transcripts_au; DROP TABLE cache_stats;"
+    )
+    conn.close()
+
+    cache = TranscriptCache(path)
+    cache.put("new", {"text": "after"})
+    stats, actual = _stored(cache)
+    assert stats == actual and actual[1] == 2
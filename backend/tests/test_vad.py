@@ -0,0 +1,25 @@
+"""
+Tests for the VAD pre-pass: times on the joined speech audio map back to the original recording.
+"""
+import numpy as np
+import pytest
+
+from audio_processing.extract_audio import SAMPLE_RATE
+from audio_processing.vad import join_regions, remap_segments
+
+
+def test_remap_segments_returns_original_times():
+    audio = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    regions = [(1 * SAMPLE_RATE, 3 * SAMPLE_RATE), (6 * SAMPLE_RATE, 7 * SAMPLE_RATE)]
+    speech, pieces = join_regions(audio, regions, gap_ms=200)
+    assert len(speech) == 3 * SAMPLE_RATE + SAMPLE_RATE // 5
+
+    second = pieces[1][0]  # where the second region starts in the joined audio
+    segments = [
+        {"start": 0.5, "end": 1.5, "text": "first"},
+        {"start": second + 0.25, "end": second + 0.75, "text": "second"},
+        {"start": 2.05, "end": second + 0.5, "text": "across the gap"},
+    ]
+    remapped = remap_segments(segments, pieces)
+    assert [(s["start"], s["end"]) for s in remapped] == pytest.approx([(1.5, 2.5), (6.25, 6.75), (3.0, 6.5)])
+    assert [s["text"] for s in remapped] == ["first", "second", "across the gap"]
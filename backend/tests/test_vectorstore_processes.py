@@ -0,0 +1,67 @@
+"""
+The ingest workers and the server are separate processes, each with its own
+Chroma handle: what a worker uploads or clears must be visible to the server.
+"""
+import multiprocessing
+
+from langchain_core.documents import Document
+
+from vectorstore import VectorStoreService
+
+
+def _use_fake_embedding():
+    import model_registry
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    model_registry._models[("embedding", model_registry.EMBEDDING_MODEL_NAME)] = DeterministicFakeEmbedding(size=32)
+
+
+def _upload(persist_directory, texts):
+    _use_fake_embedding()
+    VectorStoreService(persist_directory).add_documents(
+        [Document(page_content=text, metadata={"source_id": "worker"}) for text in texts]
+    )
+
+
+def _clear(persist_directory):
+    _use_fake_embedding()
+    VectorStoreService(persist_directory).reset()
+
+
+def _in_worker(target, *args):
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    process.start()
+    process.join(120)
+    assert process.exitcode == 0
+
+
+def _ask(store, query):
+    vector = store.store.embeddings.embed_query(query)
+    return [doc.page_content for doc in store.hybrid_search([query], [vector], k=10)[0]]
+
+
+def _dense(store, query):
+    vector = store.store.embeddings.embed_query(query)
+    return sorted(doc.page_content for doc in store.search_by_vectors([vector], k=10)[0])
+
+
+def test_server_sees_uploads_and_clear_from_worker(tmp_path):
+    _use_fake_embedding()
+    persist_directory = str(tmp_path / "chroma")
+    server = VectorStoreService(persist_directory)
+    server.add_documents([Document(page_content="server chunk about printers")])
+    assert _ask(server, "printers") == ["server chunk about printers"]
+
+    _in_worker(_upload, persist_directory, ["worker chunk about KB5034441", "worker chunk about VPN"])
+    assert server.count() == 3
+    assert _dense(server, "VPN") == [
+        "server chunk about printers", "worker chunk about KB5034441", "worker chunk about VPN"
+    ]
+    assert "worker chunk about KB5034441" in _ask(server, "KB5034441")
+
+    _in_worker(_clear, persist_directory)
+    assert server.count() == 0
+    assert _ask(server, "KB5034441") == []
+
+    # The server keeps working on the recreated collection
+    server.add_documents([Document(page_content="server chunk after clear")])
+    assert _ask(server, "clear") == ["server chunk after clear"]
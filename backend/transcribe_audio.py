@@ -1,15 +1,13 @@
 import os
-import whisper
+from model_registry import get_transcription_engine
 
-# Load the Whisper model once at import time so subsequent calls are fast
-_whisper_model = whisper.load_model("base")
-
-def transcribe_audio(audio_path: str) -> str:
+def transcribe_audio(audio_path: str, engine: str = None) -> str:
     """
     Transcribe the audio file at `audio_path` to text.
 
     Args:
         audio_path (str): Path to an audio file (wav, mp3, etc.)
+        engine (str, optional): "whisper" or "faster-whisper", defaults to TRANSCRIBE_ENGINE
 
     Returns:
         str: The transcribed text.
@@ -24,10 +22,10 @@ def transcribe_audio(audio_path: str) -> str:
 
     # 2) Perform transcription
     try:
-        result = _whisper_model.transcribe(audio_path)
+        result = get_transcription_engine(engine).transcribe(audio_path)
     except Exception as err:
         # Wrap any underlying error for clarity
         raise RuntimeError(f"Whisper transcription failed: {err}") from err
 
     # 3) Extract and return clean text
-    return result.get("text", "").strip()
+    return result["text"].strip()
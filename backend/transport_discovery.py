@@ -0,0 +1,84 @@
+import asyncio
+import os
+import threading
+import time
+from collections import namedtuple
+
+PROBE_TIMEOUT = float(os.environ.get("TRANSPORT_PROBE_TIMEOUT", "3"))
+CACHE_TTL = float(os.environ.get("TRANSPORT_CACHE_TTL", "300"))
+NEGATIVE_CACHE_TTL = float(os.environ.get("TRANSPORT_NEGATIVE_CACHE_TTL", "30"))
+
+Transport = namedtuple("Transport", ["kind", "port"])
+
+# In order of preference
+CANDIDATES = [
+    Transport("winrm", 5985),   # WinRM HTTP
+    Transport("winrm", 5986),   # WinRM HTTPS
+    Transport("ssh", 22),
+]
+
+_cache = {}  # host -> (Transport | None, expires_at)
+_cache_lock = threading.Lock()
+
+
+async def _probe(host: str, port: int, timeout: float) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def _probe_all(host: str, candidates: list, timeout: float):
+    """
+    Probe every port at once and return the most preferred open one.
+    Returns as soon as the answer is settled, e.g. WinRM is open, without
+    waiting on slower probes of less preferred ports.
+    """
+    tasks = {asyncio.ensure_future(_probe(host, c.port, timeout)): i for i, c in enumerate(candidates)}
+    status = [None] * len(candidates)  # None = pending, True/False = open/closed
+    try:
+        for done in asyncio.as_completed(list(tasks)):
+            await done
+            for task, i in tasks.items():
+                if task.done() and status[i] is None:
+                    status[i] = task.result()
+            for i, is_open in enumerate(status):
+                if is_open is None:
+                    break          # a more preferred port is still unknown
+                if is_open:
+                    return candidates[i]
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def discover_transport(host: str, timeout: float = PROBE_TIMEOUT, use_cache: bool = True):
+    """
+    Pick how to reach `host` (WinRM HTTP/HTTPS or SSH) by probing all ports concurrently.
+    Results, including "nothing open", are cached per host.
+    """
+    now = time.time()
+    if use_cache:
+        with _cache_lock:
+            hit = _cache.get(host)
+        if hit and hit[1] > now:
+            return hit[0]
+
+    transport = asyncio.run(_probe_all(host, CANDIDATES, timeout))
+    ttl = CACHE_TTL if transport else NEGATIVE_CACHE_TTL
+    with _cache_lock:
+        _cache[host] = (transport, time.time() + ttl)
+    return transport
+
+
+def invalidate_transport(host: str) -> None:
+    """Forget the cached transport, e.g. after a connection to it failed."""
+    with _cache_lock:
+        _cache.pop(host, None)
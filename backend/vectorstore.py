@@ -0,0 +1,339 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List
+from langchain_core.documents import Document
+from chromadb.api.shared_system_client import SharedSystemClient
+from langchain_chroma import Chroma
+from embedding_cache import text_hash
+from lexical_index import LexicalIndex
+from model_registry import get_embedding
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CHROMA_DB_PATH = os.path.join(script_dir, "chroma_db", "database")
+COLLECTION_NAME = os.environ.get("CHROMA_COLLECTION", "langchain")  # langchain_chroma default
+ADD_BATCH_SIZE = int(os.environ.get("CHROMA_ADD_BATCH_SIZE", "64"))
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") != "0"
+HYBRID_FETCH_K = int(os.environ.get("HYBRID_FETCH_K", "20"))  # candidates per ranking before fusion
+RRF_K = 60
+# Generation counter lives next to the DB so ingest worker processes and the app agree on it
+STORE_META_PATH = os.environ.get("STORE_META_PATH", os.path.join(script_dir, "chroma_db", "store_meta.sqlite"))
+
+
+def chroma_where(filters: dict = None):
+    """
+    {"source_id": [...], "media_type": [...]} -> Chroma `where` clause, or None
+    when nothing is filtered. Values of one field are OR-ed, fields are AND-ed.
+    """
+    clauses = [{field: {"$in": list(values)}} for field, values in (filters or {}).items() if values]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def reciprocal_rank_fusion(rankings: List[List[tuple]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """
+    Merge several [(chunk_id, Document)] rankings: each chunk scores
+    sum(1 / (rrf_k + rank)) over the rankings it appears in.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, (cid, doc) in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(cid, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[cid] for cid in best]
+
+
+def chunk_id(doc: Document) -> str:
+    """Stable ID from chunk text + metadata, so re-ingesting a file upserts instead of duplicating."""
+    meta = json.dumps(doc.metadata or {}, sort_keys=True, default=str)
+    return text_hash(doc.page_content + "\x00" + meta)
+
+
+class VectorStoreService:
+    """
+    One long-lived Chroma handle shared by upload, ask and clear.
+
+    Documents are added incrementally and a clear resets the collection in
+    place instead of deleting the directory.
+
+    Every write or reset bumps a persisted generation counter, which caches
+    of query results (see agent/answer_cache.py) use to detect stale entries.
+    Chunks are also written to a BM25 index (lexical_index.py) for hybrid search.
+
+    Ingest workers and serving processes each hold their own Chroma client,
+    and a persistent client never sees another process's writes (or its
+    collection reset). So `store` reopens the client whenever the generation
+    moved past the one it was opened at by someone else.
+
+    Ingested files are recorded as sources (ID, filename, media type, content
+    hash); their chunks carry source_id / filename / media_type metadata so
+    searches can be scoped to some files and one file can be deleted alone.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = CHROMA_DB_PATH,
+        collection_name: str = COLLECTION_NAME,
+        batch_size: int = ADD_BATCH_SIZE,
+    ):
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self._store = None
+        self._store_generation = None
+        self._lock = threading.RLock()
+        self._meta_conn = None
+        self.lexical = LexicalIndex()
+        self._lexical_checked = False
+
+    @property
+    def store(self) -> Chroma:
+        generation = self.generation()
+        if self._store is None or generation != self._store_generation:
+            with self._lock:
+                generation = self.generation()
+                if self._store is None or generation != self._store_generation:
+                    self._open_store(generation)
+        return self._store
+
+    def _open_store(self, generation: int) -> None:
+        if self._store is not None:
+            # Clients on one path share a cached System whose view is fixed at open time
+            print(f"🔄 Collection changed in another process (generation {generation}), reopening Chroma...")
+            SharedSystemClient.clear_system_cache()
+        self._store = Chroma(
+            collection_name=self.collection_name,
+            embedding_function=get_embedding(),
+            persist_directory=self.persist_directory,
+        )
+        self._store_generation = generation
+
+    def add_documents(self, documents: List[Document], batch_size: int = None) -> int:
+        """
+        Embed and upsert documents in batches, keyed by chunk hash.
+        Returns the number of unique chunks written.
+        """
+        batch_size = batch_size or self.batch_size
+        # Duplicate IDs inside one upsert are rejected by Chroma
+        unique = {}
+        for doc in documents:
+            unique.setdefault(chunk_id(doc), doc)
+        ids = list(unique.keys())
+        docs = list(unique.values())
+
+        with self._lock:
+            for i in range(0, len(docs), batch_size):
+                self.store.add_documents(docs[i : i + batch_size], ids=ids[i : i + batch_size])
+                self.lexical.add(ids[i : i + batch_size], docs[i : i + batch_size])
+            if docs:
+                self._bump_generation()
+        return len(docs)
+
+    def _query_collection(self, vectors: List[List[float]], k: int, filters: dict = None) -> List[List[tuple]]:
+        """[(chunk_id, Document)] nearest neighbours per vector, from a single Chroma query."""
+        if not vectors:
+            return []
+        result = self.store._collection.query(
+            query_embeddings=vectors, n_results=k, where=chroma_where(filters), include=["documents", "metadatas"]
+        )
+        return [
+            [(cid, Document(page_content=text, metadata=meta or {})) for cid, text, meta in zip(ids, texts, metas)]
+            for ids, texts, metas in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
+    def search_by_vectors(self, vectors: List[List[float]], k: int = 4, filters: dict = None) -> List[List[Document]]:
+        """k nearest chunks for each query vector, answered by a single Chroma query."""
+        return [[doc for _, doc in hits] for hits in self._query_collection(vectors, k, filters)]
+
+    def hybrid_search(
+        self,
+        queries: List[str],
+        vectors: List[List[float]],
+        k: int = 4,
+        fetch_k: int = HYBRID_FETCH_K,
+        filters: dict = None,
+    ) -> List[List[Document]]:
+        """
+        Dense + BM25 retrieval fused with reciprocal rank fusion, one result
+        list per query. Falls back to dense only when HYBRID_RETRIEVAL=0.
+        `filters` (see chroma_where) restricts both rankings to matching chunks.
+        """
+        if not HYBRID_RETRIEVAL:
+            return self.search_by_vectors(vectors, k, filters)
+        fetch_k = max(k, fetch_k)
+        self._ensure_lexical()
+        dense = self._query_collection(vectors, fetch_k, filters)
+        lexical = self._resolve(dense, [self.lexical.search(query, fetch_k, filters) for query in queries])
+        return [reciprocal_rank_fusion([hits, words], k) for hits, words in zip(dense, lexical)]
+
+    def _resolve(self, dense: List[List[tuple]], lexical: List[List[str]]) -> List[List[tuple]]:
+        """
+        Lexical hits (chunk IDs) as [(chunk_id, Document)] rankings. Chunks the
+        dense rankings already returned are reused; the rest are read from
+        Chroma in one call. IDs Chroma no longer has are dropped.
+        """
+        docs = {cid: doc for hits in dense for cid, doc in hits}
+        missing = list(dict.fromkeys(cid for ids in lexical for cid in ids if cid not in docs))
+        if missing:
+            found = self.store._collection.get(ids=missing, include=["documents", "metadatas"])
+            for cid, text, meta in zip(found["ids"], found["documents"], found["metadatas"]):
+                docs[cid] = Document(page_content=text, metadata=meta or {})
+        return [[(cid, docs[cid]) for cid in ids if cid in docs] for ids in lexical]
+
+    def _ensure_lexical(self) -> None:
+        """Index chunks stored before the lexical index existed (once per process)."""
+        if self._lexical_checked:
+            return
+        with self._lock:
+            if self._lexical_checked:
+                return
+            if self.lexical.is_empty() and self.count() > 0:
+                print("🔎 Building lexical index from existing chunks...")
+                offset, page = 0, 1000
+                while True:
+                    batch = self.store._collection.get(limit=page, offset=offset, include=["documents", "metadatas"])
+                    if not batch["ids"]:
+                        break
+                    self.lexical.add(batch["ids"], [
+                        Document(page_content=text, metadata=meta or {})
+                        for text, meta in zip(batch["documents"], batch["metadatas"])
+                    ])
+                    offset += page
+            self._lexical_checked = True
+
+    def count(self) -> int:
+        return self.store._collection.count()
+
+    def reset(self) -> None:
+        """Drop and recreate the collection without touching the directory."""
+        with self._lock:
+            self.store.reset_collection()
+            self.lexical.clear()
+            conn = self._meta()
+            conn.execute("DELETE FROM sources WHERE collection = ?", (self.collection_name,))
+            conn.commit()
+            self._bump_generation()
+
+    def register_source(self, source: dict, chunks: int) -> None:
+        """Record an ingested file (source_id, filename, media_type, content_hash) and its chunk count."""
+        with self._lock:
+            conn = self._meta()
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO sources
+                    (collection, source_id, filename, media_type, content_hash, chunks, added_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    self.collection_name, source["source_id"], source["filename"], source["media_type"],
+                    source["content_hash"], chunks, time.time(),
+                ),
+            )
+            conn.commit()
+
+    def get_source(self, source_id: str):
+        sources = self._select_sources("AND source_id = ?", (source_id,))
+        return sources[0] if sources else None
+
+    def list_sources(self) -> List[dict]:
+        return self._select_sources()
+
+    def _select_sources(self, condition: str = "", args: tuple = ()) -> List[dict]:
+        with self._lock:
+            cur = self._meta().execute(
+                f"""
+                SELECT source_id, filename, media_type, content_hash, chunks, added_at
+                FROM sources WHERE collection = ? {condition} ORDER BY added_at
+                """,
+                (self.collection_name, *args),
+            )
+            columns = [c[0] for c in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def delete_source(self, source_id: str) -> int:
+        """Remove one file's chunks from Chroma and the lexical index. Returns chunks removed."""
+        with self._lock:
+            # The texts are needed to take the chunks out of the contentless lexical index
+            chunks = self.store._collection.get(where={"source_id": source_id}, include=["documents"])
+            ids = chunks["ids"]
+            for i in range(0, len(ids), 5000):
+                self.store._collection.delete(ids=ids[i : i + 5000])
+            self.lexical.delete(ids, chunks["documents"])
+            conn = self._meta()
+            conn.execute(
+                "DELETE FROM sources WHERE collection = ? AND source_id = ?", (self.collection_name, source_id)
+            )
+            conn.commit()
+            if ids:
+                self._bump_generation()
+        return len(ids)
+
+    def _meta(self) -> sqlite3.Connection:
+        if self._meta_conn is None:
+            os.makedirs(os.path.dirname(STORE_META_PATH), exist_ok=True)
+            conn = sqlite3.connect(STORE_META_PATH, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    collection   TEXT NOT NULL,
+                    source_id    TEXT NOT NULL,
+                    filename     TEXT NOT NULL,
+                    media_type   TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    chunks       INTEGER NOT NULL,
+                    added_at     REAL NOT NULL,
+                    PRIMARY KEY (collection, source_id)
+                )
+                """
+            )
+            conn.commit()
+            self._meta_conn = conn
+        return self._meta_conn
+
+    def generation(self) -> int:
+        """Counter that changes whenever the collection's contents change (in any process)."""
+        with self._lock:
+            row = self._meta().execute(
+                "SELECT value FROM meta WHERE key = ?", (f"generation:{self.collection_name}",)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _bump_generation(self) -> None:
+        """Record a write made through this process's handle; callers hold self._lock."""
+        key = f"generation:{self.collection_name}"
+        conn = self._meta()
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        before = row[0] if row else 0
+        conn.execute(
+            """
+            INSERT INTO meta (key, value) VALUES (?, 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+            """,
+            (key,),
+        )
+        conn.commit()
+        # Our own write needs no reopen; one from another process in between still does
+        if before == self._store_generation:
+            self._store_generation = before + 1
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_vectorstore() -> VectorStoreService:
+    """Process-wide vectorstore service."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = VectorStoreService()
+    return _service
@@ -1,21 +1,14 @@
-import whisper
-import socket
-import winrm
-import paramiko
+import os
+import threading
 from langchain.prompts import PromptTemplate
 from langchain.chat_models import ChatOpenAI
 from langchain.chains import LLMChain
-
-# -------------------- Utility --------------------
-def is_port_open(host: str, port: int, timeout: int = 3) -> bool:
-    """Check if a given TCP port is open on the target host."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.settimeout(timeout)
-        try:
-            sock.connect((host, port))
-            return True
-        except:
-            return False
+from audio_processing.extract_audio import decode_audio
+from audio_processing.vad import join_regions, speech_regions
+from audio_processing.engines import TRANSCRIBE_ENGINE
+from model_registry import get_transcription_engine
+from remote_pool import CertificateValidationError, get_session_pool
+from transport_discovery import discover_transport, invalidate_transport
 
 # -------------------- LangChain Setup --------------------
 template = """
@@ -36,7 +29,45 @@ llm = ChatOpenAI(
 chain = LLMChain(llm=llm, prompt=prompt)
 
 # -------------------- Whisper Setup --------------------
-whisper_model = whisper.load_model("base")
+# Voice commands are short utterances: small model, greedy decoding, no context carry-over
+VOICE_WHISPER_MODEL = os.environ.get("VOICE_WHISPER_MODEL", "tiny")
+VOICE_TRANSCRIBE_ENGINE = os.environ.get("VOICE_TRANSCRIBE_ENGINE", TRANSCRIBE_ENGINE)
+VOICE_TRANSCRIBE_OPTIONS = {
+    "temperature": 0.0,
+    "beam_size": None,
+    "best_of": None,
+    "condition_on_previous_text": False,
+    "without_timestamps": True,
+    "fp16": False,
+}
+NO_SPEECH_OUTPUT = "No speech detected in the audio."
+# Transcribe audio in the background for the log even when text was typed
+LOG_TEXT_COMMAND_AUDIO = os.environ.get("VOICE_LOG_TEXT_AUDIO", "0") == "1"
+
+
+def transcribe_command(audio_path: str) -> str:
+    """
+    Low-latency transcription of a short spoken command. Only the speech
+    regions go to Whisper; a recording with no speech gives "" without
+    running it, so silence can't turn into a made-up command.
+    """
+    return _transcribe_samples(decode_audio(audio_path))
+
+
+def _transcribe_samples(audio) -> str:
+    regions = speech_regions(audio)
+    if not regions:
+        return ""
+    audio, _ = join_regions(audio, regions)
+    engine = get_transcription_engine(VOICE_TRANSCRIBE_ENGINE, VOICE_WHISPER_MODEL)
+    return engine.transcribe(audio, **VOICE_TRANSCRIBE_OPTIONS)["text"].strip()
+
+
+def _log_transcription(audio, user_text: str) -> None:
+    try:
+        print(f"📝 Command audio transcript: {_transcribe_samples(audio)!r} (typed: {user_text!r})")
+    except Exception as e:
+        print(f"⚠️ Background transcription failed: {e}")
 
 
 def process_audio_and_execute(audio_path: str, host: str, username: str, password: str, user_text: str = None) -> dict:
@@ -44,7 +75,7 @@ def process_audio_and_execute(audio_path: str, host: str, username: str, passwor
     Process voice or text command and execute on remote machine via WinRM or SSH.
 
     Args:
-        audio_path (str): Path to uploaded audio file
+        audio_path (str): Path to uploaded audio file (optional when user_text is given)
         host (str): IP/hostname of target machine
         username (str): Auth username
         password (str): Auth password
@@ -54,15 +85,21 @@ def process_audio_and_execute(audio_path: str, host: str, username: str, passwor
         dict: { transcription, command, output }
     """
 
-    # 1) Transcribe if no user text
+    # 1) Transcribe only if no user text; typed commands skip Whisper entirely
     transcription = ""
     if not user_text:
-        transcription_result = whisper_model.transcribe(audio_path)
-        user_text = transcription_result.get("text", "").strip()
+        user_text = transcribe_command(audio_path)
         transcription = user_text
-    else:
-        transcription_result = whisper_model.transcribe(audio_path)
-        transcription = transcription_result.get("text", "").strip()
+        if not user_text:
+            return {"transcription": "", "command": "", "output": NO_SPEECH_OUTPUT}
+    elif audio_path and LOG_TEXT_COMMAND_AUDIO:
+        # Decode now: the caller removes the clip once this request returns
+        try:
+            audio = decode_audio(audio_path)
+        except Exception as e:
+            print(f"⚠️ Could not decode command audio: {e}")
+        else:
+            threading.Thread(target=_log_transcription, args=(audio, user_text), daemon=True).start()
 
     # Prepare default response
     response = {
@@ -71,8 +108,10 @@ def process_audio_and_execute(audio_path: str, host: str, username: str, passwor
         "output": ""
     }
 
-    # 2) Determine execution method
-    if is_port_open(host, 5985):
+    # 2) Determine execution method (ports probed concurrently, result cached per host)
+    transport = discover_transport(host)
+
+    if transport is not None and transport.kind == "winrm":
         machine = "Windows(Powershell)"
         command = chain.run({"machine": machine, "user_input": user_text})
         response["command"] = command
@@ -81,21 +120,22 @@ def process_audio_and_execute(audio_path: str, host: str, username: str, passwor
             return response
 
         try:
-            session = winrm.Session(
-                f"http://{host}:5985/wsman",
-                auth=(username, password),
-                transport="ntlm"
-            )
-            result = session.run_ps(command)
+            # Pooled session: repeat commands to the same box skip the NTLM handshake
+            with get_session_pool().session("winrm", host, username, password, port=transport.port) as session:
+                result = session.run_ps(command)
             response["output"] = (
                 result.std_out.decode(errors="ignore")
                 if result.status_code == 0
                 else result.std_err.decode(errors="ignore")
             )
+        except CertificateValidationError as e:
+            # The port answered; probing transports again would not help
+            response["output"] = f"Certificate error during WinRM execution: {e}"
         except Exception as e:
+            invalidate_transport(host)
             response["output"] = f"Error during WinRM execution: {e}"
 
-    elif is_port_open(host, 22):
+    elif transport is not None and transport.kind == "ssh":
         machine = "SSH"
         command = chain.run({"machine": machine, "user_input": user_text})
         response["command"] = command
@@ -104,15 +144,13 @@ def process_audio_and_execute(audio_path: str, host: str, username: str, passwor
             return response
 
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(hostname=host, username=username, password=password, timeout=10)
-            stdin, stdout, stderr = ssh.exec_command(command)
-            out = stdout.read().decode(errors="ignore")
-            err = stderr.read().decode(errors="ignore")
+            with get_session_pool().session("ssh", host, username, password, port=transport.port) as ssh:
+                stdin, stdout, stderr = ssh.exec_command(command)
+                out = stdout.read().decode(errors="ignore")
+                err = stderr.read().decode(errors="ignore")
             response["output"] = out + err
-            ssh.close()
         except Exception as e:
+            invalidate_transport(host)
             response["output"] = f"Error during SSH execution: {e}"
 
     else:
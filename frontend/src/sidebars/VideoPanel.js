@@ -70,7 +70,14 @@ const VideoPanel = forwardRef(({ onSaveChat }, ref) => {
         method: "POST",
         body: formData,
       });
-      const data = await res.json();
+      let data = await res.json();
+      // Ingestion runs as a background job; poll until it finishes
+      while (data.job_id && (data.status === "queued" || data.status === "running")) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const jobRes = await fetch(`http://127.0.0.1:5000/jobs/${data.job_id}`);
+        const job = await jobRes.json();
+        data = job.status === "done" ? { ...job.result, job_id: job.id, status: job.status } : job;
+      }
       setUploadResult(data);
       setFiles(prev => [...prev, { name: file.name, size: file.size, response: data }]);
     } catch (err) {